@@ -469,6 +469,11 @@ class WordPartList:
     def can_merge(self):
         return self.prev_item and self.current_item
 
+    def get_by_signal(self, signal):
+        """ Signals are indices of word parts, so the lexical item that sent the signal is found directly """
+        if 0 <= signal < len(self.word_parts):
+            return self.word_parts[signal]
+
     def same_word(self, lex_item, other):
         return lex_item and other and lex_item.lex_parts is other.lex_parts
 
@@ -553,17 +558,8 @@ class Network(Widget):
                 first = False
 
     def add_merge(self, arg_signal, head_signal):
-        arg = None
-        head = None
-        for lex_item in self.lexicon.values():
-            if arg_signal in lex_item.activations:
-                arg = lex_item
-                if arg and head:
-                    break
-            if head_signal in lex_item.activations:
-                head = lex_item
-                if arg and head:
-                    break
+        arg = self.words.get_by_signal(arg_signal)
+        head = self.words.get_by_signal(head_signal)
         if not (arg and head):
             print('cannot find arg and head: ', arg_signal, arg, head_signal, head)
             return
@@ -0,0 +1,168 @@
+""" Benchmark for the parser generations. Each generation parses its own sentences and lexicon from a frozen corpus
+version in bench/corpus/<version>/<generation>/, so numbers can be compared across commits. Corpus versions are
+never edited in place: if sentences or lexicon need to change, copy them to a new version.
+
+    python3 bench/bench.py --output bench_output.txt
+
+Every generation runs in its own process, as they all have modules called ctrl, nodes etc. Results are JSON. """
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+CORPUS_PATH = os.path.join(HERE, 'corpus')
+CORPUS_VERSION = 'v1'
+GENERATIONS = ['improvement2', 'improvement3', 'improvement4']
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class RouteCounter:
+    """ Counts Route objects created by wrapping Route.__init__ of the generation being measured. """
+    def __init__(self):
+        self.count = 0
+
+    def install(self, route_class):
+        original_init = route_class.__init__
+
+        def counting_init(route, *args, **kwargs):
+            self.count += 1
+            original_init(route, *args, **kwargs)
+
+        route_class.__init__ = counting_init
+
+
+def count_route_edges(parser, route_edge_class):
+    if not route_edge_class:
+        return None
+    return sum(1 for edge in parser.edges.values() if isinstance(edge, route_edge_class))
+
+
+def count_good_routes(result):
+    if isinstance(result, list):
+        return len(result)
+    return None
+
+
+def run_generation(generation, corpus_dir, measure_memory=True):
+    """ Parse the corpus with one generation. Must be called in a fresh process. """
+    sys.path.insert(0, os.path.join(ROOT, generation))
+    import batch
+    import edges
+    route_counter = RouteCounter()
+    try:
+        import route
+        route_counter.install(route.Route)
+    except ImportError:
+        route = None
+    route_edge_class = getattr(edges, 'RouteEdge', None)
+
+    sentences = batch.read_sentences(os.path.join(corpus_dir, 'sentences.txt'))
+    parser = batch.BatchParser(os.path.join(corpus_dir, 'lexicon.txt'))
+    results = []
+    total_time = 0.0
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for sentence in sentences:
+            routes_before = route_counter.count
+            data = {'sentence': sentence, 'words': len(sentence.split())}
+            start = time.perf_counter()
+            try:
+                result = parser.parse_sentence(sentence)
+            except Exception as e:
+                result = None
+                data['error'] = repr(e)
+            wall_time = time.perf_counter() - start
+            total_time += wall_time
+            data['wall_time'] = wall_time
+            data['routes_created'] = route_counter.count - routes_before if route else None
+            data['route_edges'] = count_route_edges(parser, route_edge_class)
+            data['good_routes'] = count_good_routes(result)
+            results.append(data)
+
+        if measure_memory:
+            # separate pass, tracing memory slows parsing down too much to be measured at the same time
+            tracemalloc.start()
+            for data in results:
+                tracemalloc.reset_peak()
+                try:
+                    parser.parse_sentence(data['sentence'])
+                except Exception:
+                    pass
+                data['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {
+        'sentences': results,
+        'sentence_count': len(results),
+        'errors': sum(1 for data in results if 'error' in data),
+        'total_time': total_time,
+        'sentences_per_second': len(results) / total_time if total_time else None,
+        'routes_created': sum(data['routes_created'] for data in results) if route else None,
+        'peak_memory': max((data['peak_memory'] for data in results), default=0) if measure_memory else None,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def run_in_subprocess(generation, corpus_dir, measure_memory):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', generation, '--corpus-dir', corpus_dir]
+    if not measure_memory:
+        command.append('--no-memory')
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parser generations over a frozen corpus.')
+    parser.add_argument('generations', nargs='*', default=GENERATIONS, help=f'default: {" ".join(GENERATIONS)}')
+    parser.add_argument('--corpus', default=CORPUS_VERSION, help=f'corpus version, default: {CORPUS_VERSION}')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    parser.add_argument('--no-memory', action='store_true', help='skip the memory measuring pass')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--corpus-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_generation(args.worker, args.corpus_dir, measure_memory=not args.no_memory)))
+        return
+
+    report = {
+        'corpus': args.corpus,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'generations': {}
+    }
+    for generation in args.generations:
+        corpus_dir = os.path.join(CORPUS_PATH, args.corpus, generation)
+        if not os.path.isdir(corpus_dir):
+            report['generations'][generation] = {'error': f'no corpus at {corpus_dir}'}
+            continue
+        print(f'benchmarking {generation}...', file=sys.stderr)
+        report['generations'][generation] = run_in_subprocess(generation, corpus_dir, not args.no_memory)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            out_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+from ctrl import ctrl
+from grammar import Grammar
+from util import build_tree
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LEXICON_PATH = os.path.join(HERE, 'lexicon.txt')
+SENTENCES_PATH = os.path.join(HERE, 'sentences.txt')
+
+
+def read_sentences(sentences_file):
+    with open(sentences_file) as lines:
+        return [row.strip() for row in lines if row.strip() and not row.strip().startswith('#')]
+
+
+class BatchParser(Grammar):
+    """ Headless driver for the network: feeds every word part of a sentence through the word part list without
+    waiting for 'Next step' and returns the resulting tree as data. Never imports kivy. """
+    def __init__(self, lexicon_path=LEXICON_PATH, full_lexicon=False):
+        super().__init__(lexicon_path, full_lexicon=full_lexicon)
+        ctrl.post_initialize(self)
+
+    def parse_sentence(self, sentence):
+        if self.words:
+            self.reset()
+        self.parse(sentence)
+        self.tree = build_tree(self.words.word_parts)
+        while not self.words.is_last():
+            self.next_word()
+        return self.tree
+
+    def parse_sentences(self, sentences):
+        results = []
+        for sentence in sentences:
+            try:
+                results.append(self.tree_data(sentence, self.parse_sentence(sentence)))
+            except Exception as e:
+                results.append(self.tree_data(sentence, '', error=repr(e)))
+        return results
+
+    def tree_data(self, sentence, tree, error=None):
+        data = {
+            'sentence': sentence,
+            'word_parts': [str(wp) for wp in self.words.word_parts] if self.words else [],
+            'tree': tree
+        }
+        if error:
+            data['error'] = error
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse sentences without drawing the network.')
+    parser.add_argument('sentences', nargs='*', help='sentences to parse, default is to parse the sentences file')
+    parser.add_argument('--lexicon', default=LEXICON_PATH)
+    parser.add_argument('--sentences-file', default=SENTENCES_PATH)
+    parser.add_argument('--full-lexicon', action='store_true', help='load the whole lexicon once, not per sentence')
+    args = parser.parse_args()
+    sentences = args.sentences or read_sentences(args.sentences_file)
+    # parser prints its progress, keep stdout for the results
+    with redirect_stdout(sys.stderr):
+        results = BatchParser(args.lexicon, full_lexicon=args.full_lexicon).parse_sentences(sentences)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-from kivy.graphics import *
 from util import hue
 from ctrl import ctrl
 
@@ -19,6 +18,7 @@ class Edge:
         return self.activations[0] if self.activations else None
 
     def draw(self):
+        from kivy.graphics import Color, Line
         cx = self.start.x + (self.end.x - self.start.x) * .9
         cy = self.start.y + (self.end.y - self.start.y) * .9
         with ctrl.g.canvas:
@@ -86,6 +86,7 @@ class MergeEdge:
         return self.end
 
     def draw(self):
+        from kivy.graphics import Color, Bezier
         sn = self.start.li
         en = self.end.li
         cx = sn.x + (en.x - sn.x) * .9
@@ -114,6 +115,7 @@ class AdjunctEdge:
         return f'{self.__class__.__name__}({self.id})'
 
     def draw(self):
+        from kivy.graphics import Color, Line
         sn = self.start.li
         en = self.end.li
         with ctrl.g.canvas:
@@ -0,0 +1,186 @@
+from nodes import *
+from word_parts import WordPart, WordPartList
+from util import build_tree
+
+
+class Grammar:
+    """ Grammar is the parser state without any drawing: nodes and edges of the feature network, the lexicon and the
+    word part list that feeds the sentence to the network. Network in main.py adds the kivy canvas on top of this and
+    batch.py drives it headlessly. update_canvas and update_sentence are hooks for views and do nothing here. """
+    def __init__(self, lexicon_path='lexicon.txt', full_lexicon=False):
+        self.lexicon_path = lexicon_path
+        self.full_lexicon = full_lexicon
+        self.nodes = {}
+        self.edges = {}
+        self.lexicon = {}
+        self.features = {}
+        self.categories = []
+        self.merge_right = None
+        self.merge_left = None
+        self.merge_pair = None
+        self.merge_ok = None
+        self.words = None
+        self.tree = ''
+
+    def update_canvas(self, *args):
+        pass
+
+    def update_sentence(self, text=""):
+        pass
+
+    def clear_grammar(self):
+        self.nodes = {}
+        self.edges = {}
+        self.lexicon = {}
+        self.features = {}
+        self.categories = []
+        self.merge_right = None
+        self.merge_left = None
+        self.merge_pair = None
+        self.merge_ok = None
+
+    def read_lexicon(self, lexicon_file, append=False, only_these=None):
+        if not append:
+            self.lexicon.clear()
+        new_lexicon = {}
+        with open(lexicon_file) as lines:
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                word, feats = line.split('::', 1)
+                word = word.strip()
+                if only_these and word not in only_these:
+                    continue
+                word_parts = feats.split(',')
+                first = True
+                lex_parts = []
+                for feats in word_parts:
+                    if not first:
+                        word = f'({word})'
+                    cats = []
+                    neg_feats = []
+                    pos_feats = []
+                    for feat in feats.strip().split():
+                        if feat.startswith('cat:'):
+                            cats.append(self.add(CategoryNode, feat))
+                        elif feat[0] in NegFeatureNode.signs:
+                            neg_feats.append(self.add(NegFeatureNode, feat))
+                        else:
+                            pos_feats.append(self.add(PosFeatureNode, feat))
+                    lex_node = self.add(LexicalNode, word, cats, neg_feats + pos_feats, lex_parts)
+                    lex_parts.append(lex_node)
+                    new_lexicon[word] = lex_node
+                    first = False
+        if only_these:
+            self.lexicon.clear()
+            for word in only_these:
+                lex_node = new_lexicon[word]
+                self.lexicon[word] = lex_node
+                if lex_node.lex_parts:
+                    for part in lex_node.lex_parts:
+                        self.lexicon[part.id] = part
+
+        else:
+            self.lexicon = new_lexicon
+
+    def find_by_signal(self, signal):
+        for lex_item in reversed(self.lexicon.values()):
+            if signal in lex_item.activations:
+                return lex_item
+
+    def add_merge(self, head_signal, arg_signal):
+        head = self.find_by_signal(head_signal)
+        arg = self.find_by_signal(arg_signal)
+        if head and arg:
+            LexicalNode.add_merge(WordPart(head, head_signal), WordPart(arg, arg_signal))
+
+    def add_adjunction(self, first_signal, second_signal):
+        first = self.find_by_signal(first_signal)
+        second = self.find_by_signal(second_signal)
+        if first and second:
+            LexicalNode.add_adjunction(WordPart(first, first_signal), WordPart(second, second_signal))
+
+    def reset(self):
+        self.words.reset()
+        for edge in list(self.edges.values()):
+            if isinstance(edge, (MergeEdge, AdjunctEdge)):
+                del self.edges[edge.id]
+        for node in self.nodes.values():
+            node.reset()
+            if isinstance(node, LexicalNode):
+                node.head_edges.clear()
+                node.arg_edges.clear()
+                node.adjunctions.clear()
+
+    def next_word(self):
+        if not self.words:
+            return
+        if self.words.pick_next():
+            self.update_sentence(' '.join([wp.li.id for wp in self.words.word_parts]))
+        else:
+            self.reset()
+            self.words.pick_first()
+            self.update_sentence()
+
+        self.clear_activations()
+        if self.words.can_merge():
+            self.activate()
+        self.tree = build_tree(self.words.word_parts)
+        self.update_canvas()
+
+    def add(self, node_class, label, *args, **kwargs):
+        if label in self.nodes:
+            return self.nodes[label]
+        node = node_class(label, *args, **kwargs)
+        self.nodes[label] = node
+        return node
+
+    def parse(self, sentence):
+        if not self.full_lexicon:
+            self.clear_grammar()
+            self.read_lexicon(self.lexicon_path, only_these=sentence.split())
+            self.build_grammar()
+        elif not self.lexicon:
+            self.read_lexicon(self.lexicon_path)
+            self.build_grammar()
+        self.words = WordPartList(sentence.split(), self.lexicon)
+        self.words.pick_first()
+        self.update_sentence()
+
+    def build_grammar(self):
+        self.merge_right = self.add(RightMergeNode, 'M(A->B)')  # A→B
+        self.merge_left = self.add(LeftMergeNode, 'M(A<-B)')  # A←B
+        self.merge_pair = self.add(PairMergeNode, 'M(A<->B)')
+        self.merge_ok = self.add(MergeOkNode, 'OK')
+        self.merge_right.connect(self.merge_ok)
+        self.merge_left.connect(self.merge_ok)
+        self.merge_pair.connect(self.merge_ok)
+        for feat_node in self.features.values():
+            if feat_node.sign:
+                feat_node.connect(self.merge_right)
+                feat_node.connect(self.merge_left)
+                feat_node.connect_positive()
+            if feat_node.name == 'adjL':
+                feat_node.connect(self.merge_pair)
+                feat_node.connect_adjuncts()
+        for lex_node in self.lexicon.values():
+            lex_node.connect_lex_parts()
+
+    def clear_activations(self):
+        for node in self.nodes.values():
+            node.activations = []
+            node.active = False
+        for edge in self.edges.values():
+            edge.activations = []
+
+    def activate(self):
+        lefts = list(reversed(self.words.prev_items))
+        closest = self.words.closest_item
+        right = self.words.current_item
+        right.li.activate(right.signal)
+        closest.li.activate(closest.signal)
+        for left in reversed(lefts):
+            left.li.activate(left.signal)
+        print(f'*** activate {lefts}+{closest}+{right}')
+        self.update_canvas()
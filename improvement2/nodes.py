@@ -1,5 +1,3 @@
-from kivy.uix.label import Label
-from kivy.graphics import *
 from util import hue, find_edge
 from edges import Edge, LexEdge, AdjunctEdge, MergeEdge
 from ctrl import ctrl
@@ -48,6 +46,7 @@ class Node:
         self.deactivate()
 
     def add_label(self):
+        from kivy.uix.label import Label
         self.label_item = Label(text=self.id)
         self.label_item.x = self.x - 20
         self.label_item.y = self.y - 10
@@ -70,6 +69,7 @@ class Node:
             self.label_item.y = y
 
     def draw(self):
+        from kivy.graphics import Color, Line
         with ctrl.g.canvas:
             Color(*self.color)
             r = 16
@@ -78,6 +78,10 @@ class WordPartList:
         # self.print_state()
         return self.current_item
 
+    def is_last(self):
+        return self.current_item and (not self.words_left) and self.current_item.li.lex_parts[-1] is \
+               self.current_item.li
+
     def can_merge(self):
         return self.prev_items and self.current_item
 
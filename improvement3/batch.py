@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+from ctrl import ctrl
+from grammar import Grammar
+from route import Route
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LEXICON_PATH = os.path.join(HERE, 'lexicon.txt')
+SENTENCES_PATH = os.path.join(HERE, 'sentences.txt')
+
+
+def read_sentences(sentences_file):
+    with open(sentences_file) as lines:
+        return [row.strip() for row in lines if row.strip() and not row.strip().startswith('#')]
+
+
+class BatchParser(Grammar):
+    """ Headless driver for the network: feeds every word part of a sentence through the word part list without
+    waiting for 'Next step' and returns the optimal routes as data. Never imports kivy. """
+    def __init__(self, lexicon_path=LEXICON_PATH, full_lexicon=False):
+        super().__init__(lexicon_path, full_lexicon=full_lexicon)
+        ctrl.post_initialize(self)
+
+    def parse_sentence(self, sentence):
+        if self.words:
+            self.reset()
+        self.parse(sentence)
+        if self.words.is_last():
+            # one word part sentences are never stepped, so their only route is created here
+            leaf_constituent = Route(None, wp=self.words.current_item)
+            leaf_constituent.wp.li.routes_down.append(leaf_constituent)
+            self.good_routes = self.pick_optimal_route()
+        while not self.words.is_last():
+            self.next_word()
+        return self.good_routes
+
+    def parse_sentences(self, sentences):
+        results = []
+        for sentence in sentences:
+            try:
+                results.append(self.route_data(sentence, self.parse_sentence(sentence)))
+            except Exception as e:
+                # route.py raises on states that shouldn't happen, that shouldn't stop the whole batch
+                results.append(self.route_data(sentence, [], error=repr(e)))
+        return results
+
+    def route_data(self, sentence, good_routes, error=None):
+        data = {
+            'sentence': sentence,
+            'word_parts': [str(wp) for wp in self.words.word_parts] if self.words else [],
+            'routes': [{'route': route.print_route(), 'tree': route.tree(), 'size': route.size,
+                        'weight': route.weight} for route in good_routes]
+        }
+        if error:
+            data['error'] = error
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse sentences without drawing the network.')
+    parser.add_argument('sentences', nargs='*', help='sentences to parse, default is to parse the sentences file')
+    parser.add_argument('--lexicon', default=LEXICON_PATH)
+    parser.add_argument('--sentences-file', default=SENTENCES_PATH)
+    parser.add_argument('--full-lexicon', action='store_true', help='load the whole lexicon once, not per sentence')
+    args = parser.parse_args()
+    sentences = args.sentences or read_sentences(args.sentences_file)
+    # parser prints its progress, keep stdout for the results
+    with redirect_stdout(sys.stderr):
+        results = BatchParser(args.lexicon, full_lexicon=args.full_lexicon).parse_sentences(sentences)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
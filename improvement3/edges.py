@@ -1,7 +1,7 @@
-from kivy.graphics import *
 from util import hue
 from ctrl import ctrl
 import math
+from itertools import chain
 
 
 def radial_pos(i, node_i, signal_count, lex_item_count, size):
@@ -13,16 +13,91 @@ def radial_pos(i, node_i, signal_count, lex_item_count, size):
     return x, y
 
 
+def by_nodes(start, end):
+    return start, end
+
+
+def by_signals(start, end):
+    """ Word parts are equal when their signals are """
+    return start.signal, end.signal
+
+
+class EdgeList:
+    """ Edges in the order they were added, with an index from key(start, end) to the first edge with that key, so
+    finding an edge or checking if it is in the list doesn't go through the list. """
+    __slots__ = ('edges', 'index', 'key')
+
+    def __init__(self, key=by_nodes):
+        self.edges = []
+        self.index = {}
+        self.key = key
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, edge):
+        return self.index.get(self.key(edge.start, edge.end)) is edge
+
+    def append(self, edge):
+        self.edges.append(edge)
+        self.index.setdefault(self.key(edge.start, edge.end), edge)
+
+    def find(self, start, end):
+        return self.index.get(self.key(start, end))
+
+    def clear(self):
+        self.edges.clear()
+        self.index.clear()
+
+
+class EdgeRegistry:
+    """ Edges of the grammar by kind. Edges of the feature network are kept by their (start, end) nodes and stay for
+    the life of the grammar. Route, merge and adjunct edges are made while parsing a sentence and are kept by signals
+    and word parts in dicts of their own, so they are cleared without going through the network. Each edge class
+    tells its kind and key. """
+    def __init__(self):
+        self.network = {}
+        self.route_edges = {}
+        self.merge_edges = {}
+        self.adjunct_edges = {}
+
+    def add(self, edge):
+        getattr(self, edge.kind)[edge.key] = edge
+
+    def values(self):
+        return chain(self.network.values(), self.route_edges.values(), self.merge_edges.values(),
+                     self.adjunct_edges.values())
+
+    def __len__(self):
+        return len(self.network) + len(self.route_edges) + len(self.merge_edges) + len(self.adjunct_edges)
+
+    def clear_sentence(self):
+        self.route_edges.clear()
+        self.merge_edges.clear()
+        self.adjunct_edges.clear()
+
+
 class Edge:
     draw_in_route_mode = False
     draw_in_feature_mode = True
+    kind = 'network'
 
-    def __init__(self, start, end, id=''):
-        self.id = id or f'{start.id}_{end.id}'
-        ctrl.edges[self.id] = self
-        self.activations = []
+    def __init__(self, start, end):
         self.start = start
         self.end = end
+        self.activations = []
+        ctrl.edges.add(self)
+
+    @property
+    def key(self):
+        return self.start, self.end
+
+    @property
+    def id(self):
+        return f'{self.start.id}_{self.end.id}'
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.id})'
@@ -32,6 +107,7 @@ class Edge:
         return self.activations[0] if self.activations else None
 
     def draw(self):
+        from kivy.graphics import Color, Line
         cx = self.start.x + (self.end.x - self.start.x) * .9
         cy = self.start.y + (self.end.y - self.start.y) * .9
         with ctrl.g.canvas:
@@ -61,7 +137,7 @@ class Edge:
 
     @staticmethod
     def get(start, end):
-        return ctrl.edges.get(f'{start.id}_{end.id}')
+        return ctrl.edges.network.get((start, end))
 
     @staticmethod
     def get_or_create(start, end):
@@ -71,15 +147,24 @@ class Edge:
 class RouteEdge(Edge):
     draw_in_route_mode = True
     draw_in_feature_mode = False
+    kind = 'route_edges'
 
     def __init__(self, start, end, origin):
-        edge_id = f'{start.signal}_{end.signal}O{origin}'
-        super().__init__(start.li, end.li, id=edge_id)
         self.start_signal = start.signal
         self.end_signal = end.signal
         self.origin = origin
+        super().__init__(start.li, end.li)
+
+    @property
+    def key(self):
+        return self.start_signal, self.end_signal, self.origin
+
+    @property
+    def id(self):
+        return f'{self.start_signal}_{self.end_signal}O{self.origin}'
 
     def draw(self):
+        from kivy.graphics import Color, Line
         dx, dy = radial_pos(self.origin, self.start_signal, ctrl.words.signal_count, len(ctrl.g.lexicon), 40)
         ex, ey = radial_pos(self.origin, self.end_signal, ctrl.words.signal_count, len(ctrl.g.lexicon), 40)
         cx = self.start.x + dx + (self.end.x + ex - (self.start.x + dx)) * .9
@@ -92,7 +177,7 @@ class RouteEdge(Edge):
 
     @staticmethod
     def exists(start, end, origin):
-        return f'{start.signal}_{end.signal}O{origin}' in ctrl.edges
+        return (start.signal, end.signal, origin) in ctrl.edges.route_edges
 
 
 class LexEdge(Edge):
@@ -108,15 +193,16 @@ class LexEdge(Edge):
 class MergeEdge:
     draw_in_route_mode = False
     draw_in_feature_mode = True
+    kind = 'merge_edges'
 
     def __init__(self, start, end):
         print(f'** creating merge edge arg: {start} head: {end}')
-        self.id = MergeEdge.create_id(start, end)
-        ctrl.edges[self.id] = self
         self.active = True
         self.start = start
         self.end = end
         self.signal = start.signal
+        self.key = start.li, start.signal, end.li, end.signal
+        ctrl.edges.add(self)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.id})'
@@ -130,6 +216,7 @@ class MergeEdge:
         return self.end
 
     def draw(self):
+        from kivy.graphics import Color, Bezier
         sn = self.start.li
         en = self.end.li
         cx = sn.x + (en.x - sn.x) * .9
@@ -138,28 +225,34 @@ class MergeEdge:
             Color(hue(self.signal), .5, .6, mode='hsv')
             Bezier(points=[sn.x, sn.y + self.start.signal * 2, cx, cy, en.x, en.y + self.end.signal * 2], width=3)
 
-    @staticmethod
-    def create_id(start, end):
-        return f'D{start.li.id}{start.signal}_{end.li.id}{end.signal}'
+    @property
+    def id(self):
+        return f'D{self.start.li.id}{self.key[1]}_{self.end.li.id}{self.key[3]}'
 
 
 class AdjunctEdge:
     color = [0.8, 0.2, 0.2]
     draw_in_route_mode = False
     draw_in_feature_mode = True
+    kind = 'adjunct_edges'
 
     def __init__(self, start, end):
         print('** creating adjunct edge ', start, end)
-        self.id = f'{start.li.id}{start.signal}_{end.li.id}{end.signal}'
-        ctrl.edges[self.id] = self
         self.active = True
         self.start = start
         self.end = end
+        self.key = start.li, start.signal, end.li, end.signal
+        ctrl.edges.add(self)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.id})'
 
+    @property
+    def id(self):
+        return f'{self.start.li.id}{self.key[1]}_{self.end.li.id}{self.key[3]}'
+
     def draw(self):
+        from kivy.graphics import Color, Line
         sn = self.start.li
         en = self.end.li
         with ctrl.g.canvas:
@@ -0,0 +1,266 @@
+from operator import attrgetter
+
+from edges import EdgeRegistry, RouteEdge
+from nodes import *
+from word_parts import WordPart, WordPartList
+from route import Route
+
+
+class Grammar:
+    """ Grammar is the parser state without any drawing: nodes and edges of the feature network, the lexicon and the
+    word part list that feeds the sentence to the network. Network in main.py adds the kivy canvas on top of this and
+    batch.py drives it headlessly. update_canvas and update_sentence are hooks for views and do nothing here. """
+    def __init__(self, lexicon_path='lexicon.txt', full_lexicon=False):
+        self.lexicon_path = lexicon_path
+        self.full_lexicon = full_lexicon
+        self.nodes = {}
+        self.edges = EdgeRegistry()
+        self.lexicon = {}
+        self.features = {}
+        self.categories = []
+        self.merge = None
+        self.merge_pair = None
+        self.merge_ok = None
+        self.words = None
+        self.good_routes = []
+        self.counter = 0
+
+    def update_canvas(self, *args):
+        pass
+
+    def update_sentence(self, text=""):
+        pass
+
+    def clear_grammar(self):
+        self.nodes = {}
+        self.edges = EdgeRegistry()
+        self.lexicon = {}
+        self.features = {}
+        self.categories = []
+        self.merge = None
+        self.merge_pair = None
+        self.merge_ok = None
+
+    def read_lexicon(self, lexicon_file, append=False, only_these=None):
+        if not append:
+            self.lexicon.clear()
+        new_lexicon = {}
+        with open(lexicon_file) as lines:
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                word, feats = line.split('::', 1)
+                word = word.strip()
+                if only_these and word not in only_these:
+                    continue
+                word_parts = feats.split(',')
+                first = True
+                lex_parts = []
+                for feats in word_parts:
+                    if not first:
+                        word = f"{word}'"
+                    cats = []
+                    neg_feats = []
+                    pos_feats = []
+                    for feat in feats.strip().split():
+                        if feat.startswith('cat:'):
+                            cats.append(self.add(CategoryNode, feat))
+                        elif feat[0] in NegFeatureNode.signs:
+                            neg_feats.append(self.add(NegFeatureNode, feat))
+                        else:
+                            pos_feats.append(self.add(PosFeatureNode, feat))
+                    lex_node = self.add(LexicalNode, word, cats, neg_feats + pos_feats, lex_parts)
+                    lex_parts.append(lex_node)
+                    new_lexicon[word] = lex_node
+                    first = False
+        if only_these:
+            self.lexicon.clear()
+            for word in only_these:
+                lex_node = new_lexicon[word]
+                self.lexicon[word] = lex_node
+                if lex_node.lex_parts:
+                    for part in lex_node.lex_parts:
+                        self.lexicon[part.id] = part
+
+        else:
+            self.lexicon = new_lexicon
+
+    def find_by_signal(self, signal):
+        for lex_item in reversed(self.lexicon.values()):
+            if signal in lex_item.activations:
+                return lex_item
+
+    def add_merge(self, head_signal, arg_signal):
+        head = self.find_by_signal(head_signal)
+        arg = self.find_by_signal(arg_signal)
+        if head and arg:
+            LexicalNode.add_merge(WordPart(head, head_signal), WordPart(arg, arg_signal))
+
+    def add_adjunction(self, first_signal, second_signal):
+        head = self.find_by_signal(first_signal)
+        adj = self.find_by_signal(second_signal)
+        if head and adj:
+            LexicalNode.add_adjunction(WordPart(head, first_signal), WordPart(adj, second_signal))
+
+    def reset(self):
+        self.words.reset()
+        self.good_routes = []
+        self.counter = 0
+        self.edges.clear_sentence()
+        for node in self.nodes.values():
+            node.reset()
+            if isinstance(node, LexicalNode):
+                node.head_edges.clear()
+                node.arg_edges.clear()
+                node.adjunctions.clear()
+                node.adjunct_to.clear()
+                node.routes_down.clear()
+                node.route_edges.clear()
+
+    def next_word(self):
+        if not self.words:
+            return
+        if self.words.current_item.signal == 1:
+            leaf_constituent = Route(None, wp=self.words.current_item)
+            leaf_constituent.wp.li.routes_down.append(leaf_constituent)
+        if self.words.pick_next():
+            self.update_sentence(' '.join([wp.li.id for wp in self.words.word_parts]))
+        else:
+            self.reset()
+            self.words.pick_first()
+            self.update_sentence()
+
+        self.clear_activations()
+        print()
+        print(f'** Activating {self.words.current_item} ***')
+        if self.words.can_merge():
+            self.activate_current_words()
+        print()
+        print(f'*** Handling {self.words.current_item} ***')
+        leaf_constituent = Route(None, wp=self.words.current_item)
+        leaf_constituent.wp.li.routes_down.append(leaf_constituent)
+        leaf_constituent.walk_all_routes_up()
+        for wp in self.words.word_parts[:-1]:
+            print()
+            print(f' *** Revisiting {wp} ***')
+            print(f' routes to walk: {wp.li.routes_down}')
+            for route in wp.li.routes_down:
+                if route.wp is wp and len(route) == 1:
+                    route.walk_all_routes_up()
+        if self.words.is_last():
+            for wp in self.words.word_parts:
+                print()
+                print(f' *** Revisiting one last time: {wp} ***')
+                print(f' routes to walk: {wp.li.routes_down}')
+                for route in wp.li.routes_down:
+                    if route.wp is wp and len(route) == 1:
+                        route.walk_all_routes_up()
+
+            print('****************************************')
+            print('*                                      *')
+            print('* Done parsing, now pick optimal route *')
+            print('*                                      *')
+            print('****************************************')
+            self.good_routes = self.pick_optimal_route()
+        else:
+            self.show_current_routes()
+        self.update_canvas()
+
+    def add(self, node_class, label, *args, **kwargs):
+        if label in self.nodes:
+            return self.nodes[label]
+        node = node_class(label, *args, **kwargs)
+        self.nodes[label] = node
+        return node
+
+    def parse(self, sentence):
+        if not self.full_lexicon:
+            self.clear_grammar()
+            self.read_lexicon(self.lexicon_path, only_these=sentence.split())
+            self.build_grammar()
+        elif not self.lexicon:
+            self.read_lexicon(self.lexicon_path)
+            self.build_grammar()
+        self.words = WordPartList(sentence.split(), self.lexicon)
+        self.words.pick_first()
+        self.update_sentence()
+
+    def build_grammar(self):
+        self.merge = self.add(SymmetricMergeNode, 'M(A<?>B)')  # A→B
+        self.merge_pair = self.add(SymmetricPairMergeNode, 'M(A<->B)')
+        self.merge_ok = self.add(MergeOkNode, 'OK')
+        self.merge.connect(self.merge_ok)
+        self.merge_pair.connect(self.merge_ok)
+        sorted_features = sorted(self.features.values(), key=FeatureNode.sortable)
+        for feat_node in sorted_features:
+            if feat_node.sign == '=':
+                feat_node.connect(self.merge)
+                feat_node.connect_positive()
+            elif feat_node.sign == '-':
+                feat_node.connect(self.merge_pair)
+                feat_node.connect_positive()
+        for lex_node in self.lexicon.values():
+            lex_node.connect_lex_parts()
+
+    def clear_activations(self):
+        for node in self.nodes.values():
+            node.activations = []
+            node.active = False
+        for edge in self.edges.values():
+            edge.activations = []
+
+    def activate_current_words(self):
+        lefts = list(reversed(self.words.prev_items))
+        right = self.words.current_item
+        print(f' Main: *** activate {lefts}+{right}')
+        right.li.activate(right.signal)
+        for left in reversed(lefts):
+            left.li.activate(left.signal)
+        self.update_canvas()
+
+    def show_current_routes(self):
+        c = 0
+        for word_part in self.words.word_parts:
+            indent = ' ' * word_part.signal
+            print(f'{indent}*** routes down from {word_part}: ({len(word_part.li.routes_down)})')
+            for route in word_part.li.routes_down:
+                c += 1
+                if route.wp is not word_part:
+                    continue
+                print(f'{indent}{route.print_route()} {route.rs.low}-{route.rs.high}, '
+                      f'movers: {route.rs.movers} used:{route.rs.used_movers} w:{route.weight}')
+        print('routes total at this point: ', c)
+
+    def pick_optimal_route(self):
+        """ Collect routes that span the whole sentence without unused movers, best first. """
+        total_routes = 0
+        good_routes = []
+        for word_part in self.words.word_parts:
+            indent = ' ' * word_part.signal
+            print(f'{indent}*** routes down from {word_part}: ({len(word_part.li.routes_down)})')
+            for route in word_part.li.routes_down:
+                if route.wp is not word_part:
+                    continue
+                total_routes += 1
+                print(f'{indent} {route.print_route()} {route.rs.low}-{route.rs.high}, '
+                      f'{route.rs.movers} wp: {route.wp}, len: {len(route)}, '
+                      f'used_movers: {route.rs.used_movers}, weight: {route.weight}')
+
+                if route.rs.low == 1 and route.rs.high == len(self.words.word_parts) and not route.rs.movers:
+                    if route not in good_routes:
+                        good_routes.append(route)
+                    print(route.tree())
+
+            print(f'{indent} routes len: {len(word_part.li.routes_down)}')
+
+        good_routes.sort(key=attrgetter('size', 'weight'), reverse=True)
+        for route in good_routes:
+            print(route, route.rs, route.weight)
+        print('total routes: ', total_routes)
+        return good_routes
+
+    def add_route_edge(self, start, end, origin):
+        if not RouteEdge.exists(start, end, origin):
+            # route edges are made only here, a new one can't be in the list yet
+            end.li.route_edges.append(RouteEdge(start, end, origin))
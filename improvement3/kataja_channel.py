@@ -0,0 +1,98 @@
+""" Channel for sending parse results to Kataja without blocking the parser. Messages are put to a bounded queue and
+a background thread writes them to one persistent connection. Each message is a line of JSON, and messages that
+have piled up while writing are written together. If Kataja isn't listening, the thread tries again after a delay
+that doubles up to max_backoff, and when the queue is full the oldest messages are dropped. The queue and the
+counters are changed only under the channel's lock, the socket is used only by the background thread. """
+import json
+import socket
+import threading
+import time
+from collections import deque
+
+IP, PORT = '127.0.0.1', 62236
+
+
+class KatajaChannel:
+    def __init__(self, address=(IP, PORT), max_queue=100, max_batch=20, min_backoff=0.5, max_backoff=30.0):
+        self.address = address
+        self.queue = deque()
+        self.lock = threading.Condition()
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.retry_at = 0.0
+        self.sock = None
+        self.pending = []
+        self.sent = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name='kataja-channel', daemon=True)
+        self.thread.start()
+
+    def send(self, data):
+        """ Queue data to be sent as JSON. Never blocks: if the queue is full, the oldest message gives way. """
+        self.put(json.dumps(data, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def put(self, message):
+        with self.lock:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append(message)
+            self.lock.notify()
+
+    def close(self, timeout=1.0):
+        """ Stop the sender thread, trying once more to write what is queued. The thread closes the connection
+        itself, so it is never closed while being written to. """
+        self.put(None)
+        self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.queue:
+                    # when messages are waiting for a connection, wake up to retry once the backoff has passed
+                    wait = max(0.0, self.retry_at - time.monotonic()) if self.pending else None
+                    self.lock.wait(wait)
+                messages = [self.queue.popleft() for _ in range(min(len(self.queue), self.max_batch))]
+                closing = None in messages
+                self.pending += [message for message in messages if message is not None]
+                if len(self.pending) > self.max_queue:
+                    self.dropped += len(self.pending) - self.max_queue
+                    del self.pending[:-self.max_queue]
+            if closing:
+                self.retry_at = 0.0
+                self.flush()
+                self.disconnect()
+                return
+            self.flush()
+
+    def flush(self):
+        """ Write pending messages, return True if they were written """
+        if not self.pending:
+            return True
+        if not self.sock and time.monotonic() < self.retry_at:
+            return False
+        try:
+            if not self.sock:
+                self.sock = socket.create_connection(self.address, timeout=self.max_backoff)
+            self.sock.sendall(b''.join(self.pending))
+        except OSError:
+            self.disconnect()
+            self.retry_at = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            return False
+        with self.lock:
+            self.sent += len(self.pending)
+        self.pending = []
+        self.backoff = self.min_backoff
+        return True
+
+    def disconnect(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
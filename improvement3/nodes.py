@@ -1,8 +1,5 @@
-from kivy.uix.label import Label
-from kivy.graphics import *
-
-from util import hue, find_edge
-from edges import Edge, LexEdge, AdjunctEdge, MergeEdge
+from util import hue
+from edges import Edge, LexEdge, AdjunctEdge, MergeEdge, EdgeList, by_signals
 from ctrl import ctrl
 
 
@@ -14,8 +11,8 @@ class Node:
     def __init__(self, id):
         self.id = id
         ctrl.nodes[id] = self
-        self.edges_out = []
-        self.edges_in = []
+        self.edges_out = EdgeList()
+        self.edges_in = EdgeList()
         self.x = 0
         self.y = 0
         self.activations = []
@@ -51,6 +48,7 @@ class Node:
         self.deactivate()
 
     def add_label(self):
+        from kivy.uix.label import Label
         self.label_item = Label(text=self.id)
         self.label_item.x = self.x - 20
         self.label_item.y = self.y - 10
@@ -68,6 +66,7 @@ class Node:
             self.label_item.y = y
 
     def draw(self):
+        from kivy.graphics import Color, Line
         with ctrl.g.canvas:
             Color(*self.color)
             r = 16
@@ -91,10 +90,10 @@ class LexicalNode(Node):
         self.categories = cats
         self.feats = feats
         self.selected_color = [0, 0.8, 0]
-        self.arg_edges = []
-        self.head_edges = []
-        self.adjunctions = []
-        self.adjunct_to = []
+        self.arg_edges = EdgeList(by_signals)
+        self.head_edges = EdgeList(by_signals)
+        self.adjunctions = EdgeList(by_signals)
+        self.adjunct_to = EdgeList(by_signals)
         self.routes_down = []
         self.route_edges = []
         self.lex_parts = lex_parts
@@ -123,6 +122,7 @@ class LexicalNode(Node):
         return '\n'.join(f'{signal}: {len(edges)}' for signal, edges in edges_by_signal.items())
 
     def add_label(self):
+        from kivy.uix.label import Label
         self.label_item = Label(text=self.id)
         self.label_item.x = self.x - 20
         self.label_item.y = self.y - 10
@@ -169,8 +169,7 @@ class LexicalNode(Node):
 
     @staticmethod
     def add_adjunction(head, adj):
-        if (find_edge(head.li.adjunctions, start=head, end=adj)
-           or find_edge(adj.li.adjunct_to, start=head, end=adj)):
+        if head.li.adjunctions.find(head, adj) or adj.li.adjunct_to.find(head, adj):
             print('  Nodes: exists already')
             return
         edge = AdjunctEdge(adj, head)
@@ -179,7 +178,7 @@ class LexicalNode(Node):
 
     @staticmethod
     def add_merge(head, arg):
-        if find_edge(head.li.arg_edges, start=arg, end=head):
+        if head.li.arg_edges.find(arg, head):
             return
         edge = MergeEdge(arg, head)
         head.li.arg_edges.append(edge)
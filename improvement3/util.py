@@ -6,12 +6,6 @@ def hue(signal):
     return h - math.floor(h)
 
 
-def find_edge(edges, start=None, end=None):
-    for edge in edges:
-        if edge.start == start and edge.end == end:
-            return edge
-
-
 def build_tree(word_parts):
 
     def build_label(label, adjs):
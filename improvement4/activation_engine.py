@@ -0,0 +1,145 @@
+""" Optional NumPy engine for spreading activation in the feature network. Lexical, positive feature and category
+nodes, and the plain edges starting from them, only pass signals on or collect them, so their activations are kept
+in arrays of (node or edge) x signal instead of in activations dicts. Edges out of each node are in compressed
+sparse row form: out_edges[out_start[i]:out_start[i + 1]] are the edges of node i, edge_end has their end nodes.
+Activating a lexical node writes a whole wave of edges and nodes with a few array operations, and decay is one
+operation over all of them.
+
+Negative feature nodes pair signals and merge nodes add merge edges, so they keep their Python activate methods.
+The engine calls them in the same order as the recursive activation would have reached them.
+
+Arrays are the truth for the nodes and edges the engine manages: their activations dicts are filled from the
+arrays by push(), before drawing or inspecting them. """
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from activations import Activations
+from ctrl import decay_function, decay_threshold
+from edges import Edge, LexEdge
+from nodes import LexicalNode, PosFeatureNode, CategoryNode, NegFeatureNode
+
+MANAGED_NODES = (LexicalNode, PosFeatureNode, CategoryNode)
+
+Delivery = namedtuple('Delivery', 'first_edge feature second_edge node edge')
+
+
+class ActivationEngine:
+    def __init__(self, nodes, edges):
+        if np is None:
+            raise RuntimeError('activation engine needs numpy')
+        self.nodes = [node for node in nodes if isinstance(node, MANAGED_NODES)]
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.edges = [edge for edge in edges if type(edge) is Edge and edge.start in self.node_index]
+        self.edge_index = {edge: i for i, edge in enumerate(self.edges)}
+
+        out_start = [0]
+        out_edges = []
+        for node in self.nodes:
+            out_edges += [self.edge_index[edge] for edge in node.edges_out if edge in self.edge_index]
+            out_start.append(len(out_edges))
+        self.out_start = np.array(out_start, dtype=np.intp)
+        self.out_edges = np.array(out_edges, dtype=np.intp)
+        self.edge_end = np.array([self.node_index.get(edge.end, -1) for edge in self.edges], dtype=np.intp)
+        self.is_pos = np.array([isinstance(node, PosFeatureNode) for node in self.nodes], dtype=bool)
+        self.is_category = np.array([isinstance(node, CategoryNode) for node in self.nodes], dtype=bool)
+        self.deliveries = {}
+        self.node_act = np.zeros((len(self.nodes), 1))
+        # as with activations dicts, nodes stay active after their signals have faded, until they are cleared
+        self.node_active = np.zeros(len(self.nodes), dtype=bool)
+        self.edge_act = np.zeros((len(self.edges), 1))
+
+    def out_of(self, i):
+        return self.out_edges[self.out_start[i]:self.out_start[i + 1]]
+
+    def negative_deliveries(self, lex_node):
+        """ Edges that bring a signal from lex_node to negative features, in the order recursive activation would
+        follow them: either lex_node -> negative feature, or lex_node -> positive feature -> negative feature. """
+        if lex_node not in self.deliveries:
+            deliveries = []
+            for edge in lex_node.edges_out:
+                if edge not in self.edge_index:
+                    continue
+                if isinstance(edge.end, NegFeatureNode):
+                    deliveries.append(Delivery(self.edge_index[edge], -1, -1, edge.end, edge))
+                elif isinstance(edge.end, PosFeatureNode):
+                    for second_edge in edge.end.edges_out:
+                        if isinstance(second_edge.end, NegFeatureNode) and second_edge in self.edge_index:
+                            deliveries.append(Delivery(self.edge_index[edge], self.node_index[edge.end],
+                                                       self.edge_index[second_edge], second_edge.end, second_edge))
+            self.deliveries[lex_node] = deliveries
+        return self.deliveries[lex_node]
+
+    def ensure_signal(self, n):
+        if n >= self.node_act.shape[1]:
+            extra = n + 1 - self.node_act.shape[1]
+            self.node_act = np.pad(self.node_act, ((0, 0), (0, extra)))
+            self.edge_act = np.pad(self.edge_act, ((0, 0), (0, extra)))
+
+    def activate(self, lex_node, n, strength=1.0):
+        """ Same as lex_node.activate(n, strength) for the whole network """
+        i = self.node_index[lex_node]
+        self.ensure_signal(n)
+        if self.node_act[i, n]:
+            return
+        node_act = self.node_act[:, n]
+        edge_act = self.edge_act[:, n]
+        first_edges = self.out_of(i)
+        new_first = first_edges[edge_act[first_edges] == 0]
+        ends = self.edge_end[new_first]
+        features = ends[(ends >= 0) & self.is_pos[ends]]
+        new_features = features[node_act[features] == 0]
+        second_edges = np.concatenate([self.out_of(f) for f in new_features]) if len(new_features) else \
+            np.zeros(0, dtype=np.intp)
+        new_second = second_edges[edge_act[second_edges] == 0]
+
+        # decide what is new before writing, deliveries to negative features depend on it
+        deliveries = [d for d in self.negative_deliveries(lex_node) if d.first_edge in new_first and (
+                      d.feature < 0 or (d.feature in new_features and d.second_edge in new_second))]
+
+        node_act[i] = 1
+        edge_act[new_first] = strength
+        edge_act[new_second] = strength
+        node_act[new_features] = strength
+        categories = ends[(ends >= 0) & self.is_category[ends]]
+        np.add.at(node_act, categories, strength)
+        self.node_active[i] = True
+        self.node_active[new_features] = True
+        self.node_active[categories] = True
+
+        for d in deliveries:
+            d.node.activate(n, strength, source=d.edge)
+        for edge in lex_node.edges_out:
+            if isinstance(edge, LexEdge):
+                edge.activate(n, strength)
+        lex_node.active = True
+
+    def decay(self):
+        self.node_act = decay_function(self.node_act)
+        self.node_act[self.node_act < decay_threshold] = 0
+        self.edge_act = decay_function(self.edge_act)
+        self.edge_act[self.edge_act < decay_threshold] = 0
+
+    def merge_signals(self, old_signal, new_signal):
+        """ Move activations of old_signal to new_signal, the stronger one stays like in activations dicts """
+        self.ensure_signal(max(old_signal, new_signal))
+        for act in (self.node_act, self.edge_act):
+            act[:, new_signal] = np.maximum(act[:, old_signal], act[:, new_signal])
+            act[:, old_signal] = 0
+
+    def clear(self):
+        self.node_act[:] = 0
+        self.edge_act[:] = 0
+        self.node_active[:] = False
+
+    def push(self):
+        """ Write array activations to activations dicts of the managed nodes and edges """
+        for items, act in ((self.nodes, self.node_act), (self.edges, self.edge_act)):
+            for item, row in zip(items, act):
+                signals = np.flatnonzero(row)
+                item.activations = Activations((int(n), float(row[n])) for n in signals)
+        for node, active in zip(self.nodes, self.node_active):
+            node.active = bool(active)
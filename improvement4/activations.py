@@ -0,0 +1,163 @@
+""" Activations that decay lazily and follow merged signals.
+
+Instead of decaying every stored activation of every node and edge after each word, the clock ctrl.step is advanced
+and each activation remembers the step when it was last set. When an activation is read, decay_function is applied
+to it once for every step it has missed, and if it has fallen below decay_threshold it is removed then. Advancing the
+clock costs the same however large the network is.
+
+When signals are merged, the old signal becomes an alias of the new one in the aliases table, a union-find. Signals
+are looked up through the table, and a mapping that has been made before the latest merge moves its own entries to
+the new signals when it is next used, so merging costs nothing until then. """
+from collections.abc import MutableMapping
+
+from ctrl import ctrl, decay_function, decay_threshold
+
+
+class SignalAliases:
+    """ Union-find of merged signals. Pair signals (head, arg) are found member by member. """
+    def __init__(self):
+        self.parent = {}
+        self.version = 0
+
+    def find(self, signal):
+        if not self.parent:
+            return signal
+        if isinstance(signal, tuple):
+            return tuple(self.find(s) for s in signal)
+        root = signal
+        while root in self.parent:
+            root = self.parent[root]
+        while signal != root:
+            self.parent[signal], signal = root, self.parent[signal]
+        return root
+
+    def union(self, old_signal, new_signal):
+        """ Make old_signal and everything merged into it aliases of new_signal """
+        old_root = self.find(old_signal)
+        new_root = self.find(new_signal)
+        if old_root != new_root:
+            self.parent[old_root] = new_root
+            self.version += 1
+
+    def clear(self):
+        if self.parent:
+            self.parent.clear()
+            self.version += 1
+
+
+aliases = SignalAliases()
+
+
+class SignalMap(MutableMapping):
+    """ signal -> strength mapping that sees signals through aliases """
+    __slots__ = ('entries', 'version')
+    decaying = False
+
+    def __init__(self, items=()):
+        self.entries = {}
+        self.version = aliases.version
+        self.update(items)
+
+    def decayed(self, entry):
+        """ Strength of an entry now, or None if it has decayed away. Entries are (strength, step) pairs. """
+        strength, step = entry
+        if self.decaying:
+            now = ctrl.step
+            while step < now:
+                strength = decay_function(strength)
+                if strength < decay_threshold:
+                    return None
+                step += 1
+        return strength
+
+    def current(self, signal, entry):
+        """ Like decayed, but also stores the decayed strength or removes the entry """
+        if entry[1] == ctrl.step or not self.decaying:
+            return entry[0]
+        strength = self.decayed(entry)
+        if strength is None:
+            del self.entries[signal]
+        else:
+            self.entries[signal] = strength, ctrl.step
+        return strength
+
+    def follow_aliases(self):
+        """ Move entries to the signals they have been merged into. If two entries end up at the same signal the
+        stronger one stays, and pairs of a signal with itself are dropped. """
+        self.version = aliases.version
+        old_entries = self.entries
+        self.entries = {}
+        for signal, entry in old_entries.items():
+            strength = self.decayed(entry)
+            if strength is None:
+                continue
+            signal = aliases.find(signal)
+            if isinstance(signal, tuple) and signal[0] == signal[1]:
+                continue
+            if signal not in self.entries or self.entries[signal][0] < strength:
+                self.entries[signal] = strength, ctrl.step
+
+    def strength(self, signal):
+        """ Current strength of signal, or None if it isn't there or has decayed away """
+        if self.version != aliases.version:
+            self.follow_aliases()
+        if aliases.parent:
+            signal = aliases.find(signal)
+        entry = self.entries.get(signal)
+        if entry is None:
+            return None
+        return self.current(signal, entry)
+
+    def purge(self):
+        """ Remove activations that have decayed away """
+        if self.version != aliases.version:
+            self.follow_aliases()
+        for signal, entry in list(self.entries.items()):
+            self.current(signal, entry)
+
+    def __contains__(self, signal):
+        return self.strength(signal) is not None
+
+    def __getitem__(self, signal):
+        strength = self.strength(signal)
+        if strength is None:
+            raise KeyError(signal)
+        return strength
+
+    def __setitem__(self, signal, strength):
+        if self.version != aliases.version:
+            self.follow_aliases()
+        if aliases.parent:
+            signal = aliases.find(signal)
+        self.entries[signal] = strength, ctrl.step
+
+    def __delitem__(self, signal):
+        if self.version != aliases.version:
+            self.follow_aliases()
+        del self.entries[aliases.find(signal)]
+
+    def __iter__(self):
+        self.purge()
+        return iter(list(self.entries))
+
+    def __len__(self):
+        self.purge()
+        return len(self.entries)
+
+    def __bool__(self):
+        if self.version != aliases.version:
+            self.follow_aliases()
+        return any(self.current(signal, entry) is not None for signal, entry in list(self.entries.items()))
+
+    def clear(self):
+        self.entries.clear()
+        self.version = aliases.version
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({dict(self.items())})'
+
+
+class Activations(SignalMap):
+    """ SignalMap where strengths are what they would be if they had been decayed at every step """
+    __slots__ = ()
+    decaying = True
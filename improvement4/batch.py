@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+import route
+import tracing
+from ctrl import ctrl
+from grammar import Grammar
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LEXICON_PATH = os.path.join(HERE, 'lexicon.txt')
+SENTENCES_PATH = os.path.join(HERE, 'sentences.txt')
+
+
+def read_sentences(sentences_file):
+    with open(sentences_file) as lines:
+        return [row.strip() for row in lines if row.strip() and not row.strip().startswith('#')]
+
+
+class BatchParser(Grammar):
+    """ Headless driver for the network: feeds every word part of a sentence through the signaler without waiting
+    for 'Next step' and returns the optimal routes as data. Never imports kivy. """
+    def __init__(self, lexicon_path=LEXICON_PATH, full_lexicon=False, walk_routes=True, record_steps=False,
+                 **options):
+        """ options are the Grammar options: activation_engine, signal_merging, beam_width and
+        stop_at_first_parse. With record_steps the routes of every word part after every word are included in the
+        results, diffing them between two versions of the parser shows if it makes the same routes. """
+        super().__init__(lexicon_path, full_lexicon=full_lexicon, **options)
+        self.record_steps = record_steps
+        self.step_routes = []
+        route.WALK_ROUTES = walk_routes
+        ctrl.post_initialize(self)
+
+    def load_grammar(self):
+        """ Read the whole lexicon and build the network now instead of at the first sentence. Only useful with
+        full_lexicon, otherwise the network is rebuilt for every sentence anyway. """
+        if self.full_lexicon and not self.lexicon:
+            self.read_lexicon(self.lexicon_path)
+            self.build_grammar()
+
+    def parse_sentence(self, sentence):
+        self.step_routes = []
+        if self.signaler:
+            self.reset()
+            # if parse fails before it has a new signaler, the results shouldn't show the previous sentence
+            self.signaler = None
+        self.parse(sentence)
+        if self.signaler.is_last():
+            # one word part sentences are never stepped, so their only route is created here
+            leaf_constituent = self.routes.get(None, wp=self.signaler.current_item)
+            leaf_constituent.wp.li.routes_down.append(leaf_constituent)
+            self.add_parse(leaf_constituent)
+        while not self.signaler.is_last():
+            self.next_word()
+            if self.record_steps:
+                self.step_routes.append(self.routes_by_word_part())
+        return self.pick_optimal_route()
+
+    def routes_by_word_part(self):
+        """ Routes down from each word part's lexical node, in their order, with their weights """
+        return [[str(wp), [[route.print_route(), route.weight] for route in wp.li.routes_down]]
+                for wp in self.signaler.word_parts]
+
+    def parse_sentences(self, sentences):
+        return [self.parse_to_data(sentence) for sentence in sentences]
+
+    def parse_to_data(self, sentence):
+        try:
+            return self.route_data(sentence, self.parse_sentence(sentence))
+        except Exception as e:
+            # route.py raises on states that shouldn't happen, that shouldn't stop the whole batch
+            return self.route_data(sentence, [], error=repr(e))
+
+    def route_data(self, sentence, good_routes, error=None):
+        data = {
+            'sentence': sentence,
+            'word_parts': [str(wp) for wp in self.signaler.word_parts] if self.signaler else [],
+            'routes': [{'route': route.print_route(), 'tree': route.tree(), 'size': route.size,
+                        'weight': route.weight} for route in good_routes]
+        }
+        if self.beam:
+            data['pruned'] = self.beam.pruned
+        if self.record_steps:
+            data['steps'] = self.step_routes
+        if error:
+            data['error'] = error
+        return data
+
+
+worker_parser = None
+
+
+def init_worker(lexicon_path, options):
+    global worker_parser
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        worker_parser = BatchParser(lexicon_path, **options)
+        worker_parser.load_grammar()
+
+
+def parse_in_worker(job):
+    i, sentence = job
+    # workers print their progress like the parser does, it would only interleave
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return i, worker_parser.parse_to_data(sentence)
+
+
+def parse_parallel(sentences, processes=None, lexicon_path=LEXICON_PATH, **options):
+    """ Parse sentences in a pool of worker processes, each with a network of its own. Longest sentences are
+    handed out first so that a long sentence doesn't end up running alone at the end. Results are in the same order
+    as sentences. """
+    with create_pool(processes, lexicon_path, **options) as pool:
+        return parse_in_pool(pool, sentences)
+
+
+def create_pool(processes=None, lexicon_path=LEXICON_PATH, **options):
+    """ Pool of workers with a BatchParser each, options are given to BatchParser """
+    return Pool(processes, initializer=init_worker, initargs=(lexicon_path, options))
+
+
+def parse_in_pool(pool, sentences):
+    jobs = sorted(enumerate(sentences), key=lambda job: len(job[1].split()), reverse=True)
+    results = [None] * len(sentences)
+    for i, data in pool.imap_unordered(parse_in_worker, jobs):
+        results[i] = data
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse sentences without drawing the network.')
+    parser.add_argument('sentences', nargs='*', help='sentences to parse, default is to parse the sentences file')
+    parser.add_argument('--lexicon', default=LEXICON_PATH)
+    parser.add_argument('--sentences-file', default=SENTENCES_PATH)
+    parser.add_argument('--full-lexicon', action='store_true', help='load the whole lexicon once, not per sentence')
+    parser.add_argument('--no-walk', action='store_true', help='keep walking routes up switched off like in main.py')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='parse in this many worker processes, 0 uses all cores')
+    parser.add_argument('--activation-engine', action='store_true',
+                        help='spread activation with numpy arrays instead of node by node')
+    parser.add_argument('--merge-signals', action='store_true',
+                        help='merge signals of arguments and adjuncts to their heads after each word')
+    parser.add_argument('--beam-width', type=int,
+                        help='keep only this many best routes for each head word part, pruned counts are reported')
+    parser.add_argument('--first-parse', action='store_true',
+                        help='stop walking routes at the first route that spans the whole sentence')
+    parser.add_argument('--steps', action='store_true',
+                        help='include the routes of every word part after every word, to compare parser versions')
+    parser.add_argument('--trace', action='append', choices=tracing.CATEGORIES, default=[],
+                        help='write trace events of this category to stderr, can be repeated')
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(*args.trace, output_file=sys.stderr)
+    sentences = args.sentences or read_sentences(args.sentences_file)
+    options = dict(full_lexicon=args.full_lexicon, walk_routes=not args.no_walk, record_steps=args.steps,
+                   activation_engine=args.activation_engine, signal_merging=args.merge_signals,
+                   beam_width=args.beam_width, stop_at_first_parse=args.first_parse)
+    # parser prints its progress, keep stdout for the results
+    with redirect_stdout(sys.stderr):
+        if args.processes == 1:
+            results = BatchParser(args.lexicon, **options).parse_sentences(sentences)
+        else:
+            results = parse_parallel(sentences, args.processes or None, lexicon_path=args.lexicon, **options)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+""" Compiled lexicon. The text lexicon is compiled into a binary file next to it, '<lexicon>.compiled', which has an
+index from word to the byte offset of its entry and the entries with their features already split:
+
+    MAGIC | source mtime_ns, source size, index length, entries length | marshalled index | marshalled entries
+
+The index maps word -> (position in the text lexicon, offset, length). An entry is the list of definitions of the
+word, a definition is a list of word parts and a word part is a list of feature strings. Loading words for a
+sentence reads only the index once and then the entries of those words. The compiled file is rebuilt when the text
+lexicon's modification time or size doesn't match what the compiled file was made from, when it was written by
+another Python or marshal version, whose format may differ, or when it can't be read. """
+import marshal
+import os
+import struct
+import sys
+
+# marshal format is only stable within one Python version, so the magic line tells which one wrote the file
+MAGIC = (f'NodeMerge lexicon 2 {sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]} '
+         f'marshal {marshal.version}\n').encode()
+HEADER = struct.Struct('<qqQQ')
+COMPILED_SUFFIX = '.compiled'
+
+_open_lexicons = {}
+
+
+def parse_lexicon_text(lines):
+    """ Return {word: [definition, ...]} in the order of words in the text """
+    entries = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        word, feats = line.split('::', 1)
+        word = word.strip()
+        entries.setdefault(word, []).append([part.strip().split() for part in feats.split(',')])
+    return entries
+
+
+def compile_lexicon(source_path, compiled_path):
+    with open(source_path) as lines:
+        entries = parse_lexicon_text(lines)
+    stat = os.stat(source_path)
+    index = {}
+    data = []
+    offset = 0
+    for position, (word, definitions) in enumerate(entries.items()):
+        record = marshal.dumps(definitions)
+        index[word] = (position, offset, len(record))
+        data.append(record)
+        offset += len(record)
+    index_data = marshal.dumps(index)
+    tmp_path = f'{compiled_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as out_file:
+        out_file.write(MAGIC)
+        out_file.write(HEADER.pack(stat.st_mtime_ns, stat.st_size, len(index_data), offset))
+        out_file.write(index_data)
+        out_file.writelines(data)
+    os.replace(tmp_path, compiled_path)
+
+
+class CompiledLexicon:
+    """ Reader for a compiled lexicon, compiling it first if needed """
+    def __init__(self, source_path, compiled_path=None):
+        self.source_path = source_path
+        self.compiled_path = compiled_path or source_path + COMPILED_SUFFIX
+        self.source_stat = None
+        self.index = {}
+        self.data_start = 0
+        self.in_memory = None
+        self.load()
+
+    def source_changed(self):
+        stat = os.stat(self.source_path)
+        return (stat.st_mtime_ns, stat.st_size) != self.source_stat
+
+    def read_compiled(self):
+        """ Return (source stat, index, data start) from the compiled file, or None if it is missing, truncated or
+        not readable by this Python """
+        try:
+            with open(self.compiled_path, 'rb') as in_file:
+                if in_file.read(len(MAGIC)) != MAGIC:
+                    return None
+                mtime, size, index_length, data_length = HEADER.unpack(in_file.read(HEADER.size))
+                data_start = len(MAGIC) + HEADER.size + index_length
+                if os.fstat(in_file.fileno()).st_size != data_start + data_length:
+                    return None
+                index = marshal.loads(in_file.read(index_length))
+        except (OSError, EOFError, ValueError, TypeError, struct.error):
+            return None
+        if not isinstance(index, dict):
+            return None
+        return (mtime, size), index, data_start
+
+    def load(self):
+        stat = os.stat(self.source_path)
+        source_stat = stat.st_mtime_ns, stat.st_size
+        compiled = self.read_compiled()
+        if not compiled or compiled[0] != source_stat:
+            try:
+                compile_lexicon(self.source_path, self.compiled_path)
+            except OSError:
+                compiled = None
+            else:
+                compiled = self.read_compiled()
+        if not compiled:
+            # can't write next to the lexicon or read what was written, keep the parsed lexicon in memory instead
+            with open(self.source_path) as lines:
+                self.in_memory = parse_lexicon_text(lines)
+            self.index = {word: (position, 0, 0) for position, word in enumerate(self.in_memory)}
+            self.source_stat = source_stat
+            return
+        self.in_memory = None
+        self.source_stat, self.index, self.data_start = compiled
+
+    def entries(self, words=None):
+        """ Yield (word, definitions) for given words, or for all words, in the order of the text lexicon. Words
+        missing from the lexicon are skipped. """
+        if self.source_changed():
+            self.load()
+        if words is None:
+            found = list(self.index)
+        else:
+            found = sorted({word for word in words if word in self.index}, key=lambda word: self.index[word][0])
+        if self.in_memory is not None:
+            for word in found:
+                yield word, self.in_memory[word]
+            return
+        with open(self.compiled_path, 'rb') as in_file:
+            for word in found:
+                position, offset, length = self.index[word]
+                in_file.seek(self.data_start + offset)
+                yield word, marshal.loads(in_file.read(length))
+
+
+def open_lexicon(source_path):
+    """ Compiled lexicon for text lexicon at source_path, shared by all readers in this process """
+    path = os.path.abspath(source_path)
+    if path not in _open_lexicons:
+        _open_lexicons[path] = CompiledLexicon(path)
+    return _open_lexicons[path]
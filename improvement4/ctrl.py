@@ -3,6 +3,8 @@
 class Controller:
     def __init__(self):
         self.g = None
+        # decay clock, see activations.py
+        self.step = 0
 
     def post_initialize(self, g):
         self.g = g
@@ -19,6 +21,10 @@ class Controller:
     def features(self):
         return self.g.features
 
+    @property
+    def positive_features(self):
+        return self.g.positive_features
+
     @property
     def signaler(self):
         return self.g.signaler
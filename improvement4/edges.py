@@ -1,7 +1,9 @@
-from kivy.graphics import *
-from util import hue, replace
-from ctrl import ctrl, decay_function, decay_threshold
+import tracing
+from util import hue
+from ctrl import ctrl
+from activations import Activations
 import math
+from itertools import chain
 
 
 def radial_pos(i, node_i, signal_count, lex_item_count, size):
@@ -13,16 +15,101 @@ def radial_pos(i, node_i, signal_count, lex_item_count, size):
     return x, y
 
 
+def by_nodes(start, end):
+    return start, end
+
+
+def by_signals(start, end):
+    """ Word parts are equal when their signals are """
+    return start.signal, end.signal
+
+
+class EdgeList:
+    """ Edges in the order they were added, with an index from key(start, end) to the first edge with that key, so
+    finding an edge or checking if it is in the list doesn't go through the list. """
+    __slots__ = ('edges', 'index', 'key')
+
+    def __init__(self, key=by_nodes):
+        self.edges = []
+        self.index = {}
+        self.key = key
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, edge):
+        return self.index.get(self.key(edge.start, edge.end)) is edge
+
+    def append(self, edge):
+        self.edges.append(edge)
+        self.index.setdefault(self.key(edge.start, edge.end), edge)
+
+    def find(self, start, end):
+        return self.index.get(self.key(start, end))
+
+    def reindex(self):
+        """ Build the index again after the keys of edges have changed """
+        self.index = {}
+        for edge in self.edges:
+            self.index.setdefault(self.key(edge.start, edge.end), edge)
+
+    def clear(self):
+        self.edges.clear()
+        self.index.clear()
+
+
+class EdgeRegistry:
+    """ Edges of the grammar by kind. Edges of the feature network are kept by their (start, end) nodes and stay for
+    the life of the grammar. Route, merge and adjunct edges are made while parsing a sentence and are kept by signals
+    and word parts in dicts of their own, so they are cleared without going through the network. Each edge class
+    tells its kind and key. """
+    def __init__(self):
+        self.network = {}
+        self.route_edges = {}
+        self.merge_edges = {}
+        self.adjunct_edges = {}
+
+    def add(self, edge):
+        getattr(self, edge.kind)[edge.key] = edge
+
+    def values(self):
+        return chain(self.network.values(), self.route_edges.values(), self.merge_edges.values(),
+                     self.adjunct_edges.values())
+
+    def activated(self):
+        """ Edges that carry activations, merge and adjunct edges don't """
+        return chain(self.network.values(), self.route_edges.values())
+
+    def __len__(self):
+        return len(self.network) + len(self.route_edges) + len(self.merge_edges) + len(self.adjunct_edges)
+
+    def clear_sentence(self):
+        self.route_edges.clear()
+        self.merge_edges.clear()
+        self.adjunct_edges.clear()
+
+
 class Edge:
     draw_in_route_mode = False
     draw_in_feature_mode = True
+    kind = 'network'
 
-    def __init__(self, start, end, id=''):
-        self.id = id or f'{start.id}_{end.id}'
-        ctrl.edges[self.id] = self
-        self.activations = {}
+    def __init__(self, start, end):
         self.start = start
         self.end = end
+        self.activations = Activations()
+        ctrl.edges.add(self)
+
+    @property
+    def key(self):
+        return self.start, self.end
+
+    @property
+    def id(self):
+        return f'{self.start.id}_{self.end.id}'
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.id})'
@@ -31,24 +118,28 @@ class Edge:
     def signal(self):
         return list(self.activations.keys())[0] if self.activations else None
 
+    def draw_state(self):
+        """ Everything draw depends on, edge is drawn again only when this changes """
+        return self.start.x, self.start.y, self.end.x, self.end.y, tuple(self.activations.items())
+
     def draw(self):
+        from kivy.graphics import Color, Line
         cx = self.start.x + (self.end.x - self.start.x) * .9
         cy = self.start.y + (self.end.y - self.start.y) * .9
-        with ctrl.g.canvas:
-            Color(*self.color)
-            Line(points=[self.start.x, self.start.y, self.end.x, self.end.y], width=1)
-            Line(circle=[cx, cy, 5], width=3)
-            x_diff = 0
-            y_diff = 0
-            for activation, weight in self.activations.items():
-                if not isinstance(activation, tuple):
-                    activation = [activation]
-                for signal in activation:
-                    Color(hue(signal), 0.8, 0.5, mode='hsv')
-                    Line(points=[self.start.x + x_diff, self.start.y + y_diff, self.end.x + x_diff, self.end.y + y_diff], width=weight)
-                    Line(circle=[cx, cy, 5], width=3)
-                    x_diff += weight
-                x_diff += 2
+        Color(*self.color)
+        Line(points=[self.start.x, self.start.y, self.end.x, self.end.y], width=1)
+        Line(circle=[cx, cy, 5], width=3)
+        x_diff = 0
+        y_diff = 0
+        for activation, weight in self.activations.items():
+            if not isinstance(activation, tuple):
+                activation = [activation]
+            for signal in activation:
+                Color(hue(signal), 0.8, 0.5, mode='hsv')
+                Line(points=[self.start.x + x_diff, self.start.y + y_diff, self.end.x + x_diff, self.end.y + y_diff], width=weight)
+                Line(circle=[cx, cy, 5], width=3)
+                x_diff += weight
+            x_diff += 2
 
     def activate(self, n, strength=1.0):
         if n not in self.activations:
@@ -56,15 +147,7 @@ class Edge:
             self.end.activate(n, strength=strength, source=self)
 
     def decay(self):
-        for signal, strength in list(self.activations.items()):
-            new_strength = decay_function(strength)
-            if new_strength < decay_threshold:
-                del self.activations[signal]
-            else:
-                self.activations[signal] = new_strength
-
-    def merge_activations(self, old_value, new_value):
-        self.activations = replace(self.activations, old_value, new_value)
+        self.activations.purge()
 
     @property
     def color(self):
@@ -72,7 +155,7 @@ class Edge:
 
     @staticmethod
     def get(start, end):
-        return ctrl.edges.get(f'{start.id}_{end.id}')
+        return ctrl.edges.network.get((start, end))
 
     @staticmethod
     def get_or_create(start, end):
@@ -82,28 +165,40 @@ class Edge:
 class RouteEdge(Edge):
     draw_in_route_mode = True
     draw_in_feature_mode = False
+    kind = 'route_edges'
 
     def __init__(self, start, end, origin):
-        edge_id = f'{start.signal}_{end.signal}O{origin}'
-        super().__init__(start.li, end.li, id=edge_id)
         self.start_signal = start.signal
         self.end_signal = end.signal
         self.origin = origin
+        super().__init__(start.li, end.li)
+
+    @property
+    def key(self):
+        return self.start_signal, self.end_signal, self.origin
+
+    @property
+    def id(self):
+        return f'{self.start_signal}_{self.end_signal}O{self.origin}'
+
+    def draw_state(self):
+        return (self.start.x, self.start.y, self.end.x, self.end.y, ctrl.signaler.signal_count,
+                len(ctrl.g.lexicon))
 
     def draw(self):
+        from kivy.graphics import Color, Line
         dx, dy = radial_pos(self.origin, self.start_signal, ctrl.signaler.signal_count, len(ctrl.g.lexicon), 40)
         ex, ey = radial_pos(self.origin, self.end_signal, ctrl.signaler.signal_count, len(ctrl.g.lexicon), 40)
         cx = self.start.x + dx + (self.end.x + ex - (self.start.x + dx)) * .9
         cy = self.start.y + dy + (self.end.y + ey - (self.start.y + dy)) * .9
 
-        with ctrl.g.canvas:
-            Color(hue(self.origin), 0.8, 0.5, mode='hsv')
-            Line(points=[self.start.x + dx, self.start.y + dy, self.end.x + ex, self.end.y + ey], width=2)
-            Line(circle=[cx, cy, 5], width=3)
+        Color(hue(self.origin), 0.8, 0.5, mode='hsv')
+        Line(points=[self.start.x + dx, self.start.y + dy, self.end.x + ex, self.end.y + ey], width=2)
+        Line(circle=[cx, cy, 5], width=3)
 
     @staticmethod
     def exists(start, end, origin):
-        return f'{start.signal}_{end.signal}O{origin}' in ctrl.edges
+        return (start.signal, end.signal, origin) in ctrl.edges.route_edges
 
 
 class LexEdge(Edge):
@@ -122,15 +217,17 @@ class LexEdge(Edge):
 class MergeEdge:
     draw_in_route_mode = False
     draw_in_feature_mode = True
+    kind = 'merge_edges'
 
     def __init__(self, start, end):
-        print(f'** creating merge edge arg: {start} head: {end}')
-        self.id = MergeEdge.create_id(start, end)
-        ctrl.edges[self.id] = self
+        if tracing.EDGES in tracing.active:
+            tracing.event(tracing.EDGES, 'merge edge', arg=start, head=end)
         self.active = True
         self.start = start
         self.end = end
         self.signal = start.signal
+        self.key = start.li, start.signal, end.li, end.signal
+        ctrl.edges.add(self)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.id})'
@@ -143,45 +240,61 @@ class MergeEdge:
     def head(self):
         return self.end
 
+    def draw_state(self):
+        sn = self.start.li
+        en = self.end.li
+        return sn.x, sn.y, en.x, en.y, self.start.signal, self.end.signal, self.signal
+
     def draw(self):
+        from kivy.graphics import Color, Bezier
         sn = self.start.li
         en = self.end.li
         cx = sn.x + (en.x - sn.x) * .9
         cy = sn.y + (en.x - sn.x) * -.3
-        with ctrl.g.canvas:
-            Color(hue(self.signal), .5, .6, mode='hsv')
-            Bezier(points=[sn.x, sn.y + self.start.signal * 2, cx, cy, en.x, en.y + self.end.signal * 2], width=3)
+        Color(hue(self.signal), .5, .6, mode='hsv')
+        Bezier(points=[sn.x, sn.y + self.start.signal * 2, cx, cy, en.x, en.y + self.end.signal * 2], width=3)
 
     def decay(self):
         pass
 
-    @staticmethod
-    def create_id(start, end):
-        return f'D{start.li.id}{start.signal}_{end.li.id}{end.signal}'
+    @property
+    def id(self):
+        return f'D{self.start.li.id}{self.key[1]}_{self.end.li.id}{self.key[3]}'
 
 
 class AdjunctEdge:
     color = [0.8, 0.2, 0.2]
     draw_in_route_mode = False
     draw_in_feature_mode = True
+    kind = 'adjunct_edges'
 
     def __init__(self, start, end):
-        print('** creating adjunct edge ', start, end)
-        self.id = f'{start.li.id}{start.signal}_{end.li.id}{end.signal}'
-        ctrl.edges[self.id] = self
+        if tracing.EDGES in tracing.active:
+            tracing.event(tracing.EDGES, 'adjunct edge', start=start, end=end)
         self.active = True
         self.start = start
         self.end = end
+        self.key = start.li, start.signal, end.li, end.signal
+        ctrl.edges.add(self)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.id})'
 
+    @property
+    def id(self):
+        return f'{self.start.li.id}{self.key[1]}_{self.end.li.id}{self.key[3]}'
+
     def decay(self):
         pass
 
+    def draw_state(self):
+        sn = self.start.li
+        en = self.end.li
+        return sn.x, sn.y, en.x, en.y, self.start.signal, self.end.signal
+
     def draw(self):
+        from kivy.graphics import Color, Line
         sn = self.start.li
         en = self.end.li
-        with ctrl.g.canvas:
-            Color(hue(self.start.signal), .5, .6, mode='hsv')
-            Line(points=[sn.x, sn.y - self.start.signal, en.x, en.y - self.end.signal], width=1)
+        Color(hue(self.start.signal), .5, .6, mode='hsv')
+        Line(points=[sn.x, sn.y - self.start.signal, en.x, en.y - self.end.signal], width=1)
@@ -0,0 +1,340 @@
+import tracing
+from activation_engine import ActivationEngine
+from activations import aliases
+from compiled_lexicon import open_lexicon
+from edges import EdgeRegistry, RouteEdge
+from nodes import *
+from signaler import Signaler
+from route import Agenda, RouteTable
+from route_store import Beam, BestParses
+from route_signal import signals
+
+
+class Grammar:
+    """ Grammar is the parser state without any drawing: nodes and edges of the feature network, the lexicon and the
+    signaler that feeds the sentence to the network. Network in main.py adds the kivy canvas on top of this and
+    batch.py drives it headlessly. update_canvas and update_sentence are hooks for views and do nothing here. """
+    def __init__(self, lexicon_path='lexicon.txt', full_lexicon=False, activation_engine=False, signal_merging=False,
+                 beam_width=None, stop_at_first_parse=False):
+        self.lexicon_path = lexicon_path
+        self.full_lexicon = full_lexicon
+        self.signal_merging = signal_merging
+        # keep only the best beam_width routes for each head word part, None keeps all
+        self.beam = Beam(beam_width) if beam_width else None
+        # complete parses are collected as they are made, optionally stopping the search at the first one
+        self.parses = BestParses()
+        self.stop_at_first_parse = stop_at_first_parse
+        self.use_activation_engine = activation_engine
+        self.engine = None
+        self.nodes = {}
+        self.edges = EdgeRegistry()
+        self.lexicon = {}
+        self.features = {}
+        self.positive_features = {}
+        # feature values as bits, each value string gets a bit of its own the first time it is seen
+        self.value_bits = {}
+        self.categories = []
+        self.merge = None
+        self.merge_pair = None
+        self.merge_ok = None
+        self.signaler = None
+        self.agenda = Agenda()
+        self.routes = RouteTable()
+        self.counter = 0
+
+    def update_canvas(self, *args):
+        pass
+
+    def update_sentence(self, text=""):
+        pass
+
+    def clear_grammar(self):
+        self.nodes = {}
+        self.edges = EdgeRegistry()
+        self.lexicon = {}
+        self.features = {}
+        self.positive_features = {}
+        self.value_bits = {}
+        self.categories = []
+        self.merge = None
+        self.merge_pair = None
+        self.merge_ok = None
+
+    def value_mask(self, values):
+        """ Bits of feature values. An empty value gets no bit, so like in the old scan of values it matches
+        nothing. """
+        mask = 0
+        for value in values:
+            if not value:
+                continue
+            if value not in self.value_bits:
+                self.value_bits[value] = 1 << len(self.value_bits)
+            mask |= self.value_bits[value]
+        return mask
+
+    def merge_signals(self, old_signal, new_signal):
+        """ Make old_signal an alias of new_signal. Activations and route signals follow the alias when they are
+        next read, so nothing is gone through here. """
+        aliases.union(old_signal, new_signal)
+        if self.engine:
+            self.engine.merge_signals(old_signal, new_signal)
+
+    def read_lexicon(self, lexicon_file, append=False, only_these=None):
+        if not append:
+            self.lexicon.clear()
+        new_lexicon = {}
+        for word, definitions in open_lexicon(lexicon_file).entries(only_these):
+            for word_parts in definitions:
+                part_word = word
+                first = True
+                lex_parts = []
+                for feats in word_parts:
+                    if not first:
+                        part_word = f"{part_word}'"
+                    cats = []
+                    neg_feats = []
+                    pos_feats = []
+                    for feat in feats:
+                        if feat.startswith('cat:'):
+                            cats.append(self.add(CategoryNode, feat))
+                        elif feat[0] in NegFeatureNode.signs:
+                            neg_feats.append(self.add(NegFeatureNode, feat))
+                        else:
+                            pos_feats.append(self.add(PosFeatureNode, feat))
+                    lex_node = self.add(LexicalNode, part_word, cats, neg_feats + pos_feats, lex_parts)
+                    lex_parts.append(lex_node)
+                    new_lexicon[part_word] = lex_node
+                    first = False
+        if only_these:
+            self.lexicon.clear()
+            for word in only_these:
+                lex_node = new_lexicon[word]
+                self.lexicon[word] = lex_node
+                if lex_node.lex_parts:
+                    for part in lex_node.lex_parts:
+                        self.lexicon[part.id] = part
+
+        else:
+            self.lexicon = new_lexicon
+
+    def find_by_signal(self, signal):
+        return self.signaler.get_lex_item(signal)
+
+    def get_wp(self, signal):
+        return self.signaler.get_first_wp(signal)
+
+    def get_first_wp(self, signal):
+        return self.signaler.get_first_wp(signal)
+
+    def get_last_wp(self, signal):
+        return self.signaler.get_last_wp(signal)
+
+    def add_merge(self, head_signal, arg_signal):
+        if head_signal < arg_signal or True:
+            head = self.get_first_wp(head_signal)
+            arg = self.get_first_wp(arg_signal)
+        else:
+            head = self.get_first_wp(head_signal)
+            arg = self.get_last_wp(arg_signal)
+        if head and arg:
+            LexicalNode.add_merge(head, arg)
+
+    def add_adjunction(self, first_signal, second_signal):
+        head = self.get_wp(first_signal)
+        adj = self.get_wp(second_signal)
+        if head and adj:
+            LexicalNode.add_adjunction(head, adj)
+
+    def reset(self):
+        self.signaler.reset()
+        self.agenda.clear()
+        self.routes.clear()
+        if self.beam:
+            self.beam.clear()
+        self.parses.clear()
+        self.counter = 0
+        self.edges.clear_sentence()
+        for node in self.nodes.values():
+            node.reset()
+            if isinstance(node, LexicalNode):
+                node.head_edges.clear()
+                node.arg_edges.clear()
+                node.adjunctions.clear()
+                node.adjunct_to.clear()
+                node.routes_down.clear()
+                node.route_edges.clear()
+                node.info_route_edges = None
+        self.clear_activations()
+        aliases.clear()
+
+    def decay_signals(self):
+        ctrl.step += 1
+        if self.engine:
+            self.engine.decay()
+
+    def next_word(self):
+        if not self.signaler:
+            return
+        if self.signaler.current_item.signal == 1:
+            self.update_canvas()
+            leaf_constituent = self.routes.get(None, wp=self.signaler.current_item)
+            leaf_constituent.wp.li.routes_down.append(leaf_constituent)
+        if self.signaler.pick_next():
+            self.update_sentence(' '.join([wp.li.id for wp in self.signaler.word_parts]))
+        else:
+            self.reset()
+            self.signaler.pick_first()
+            self.update_sentence()
+        if tracing.PARSE in tracing.active:
+            tracing.event(tracing.PARSE, 'activating', wp=self.signaler.current_item)
+        if self.signaler.can_merge():
+            self.decay_signals()
+            self.signaler.activate_current_words(self.engine)
+            self.update_canvas()
+        if tracing.PARSE in tracing.active:
+            tracing.event(tracing.PARSE, 'handling', wp=self.signaler.current_item)
+        leaf_constituent = self.routes.get(None, wp=self.signaler.current_item)
+        leaf_constituent.wp.li.routes_down.append(leaf_constituent)
+        leaf_constituent.walk_all_routes_up()
+        if self.signal_merging:
+            self.merge_routed_signals()
+        self.show_current_routes()
+        self.update_canvas()
+
+    def merge_routed_signals(self):
+        """ Give arguments and adjuncts of the best route of each word part the signal of their head """
+        for wp in self.signaler.word_parts:
+            if wps_to_merge := self.should_merge_signals(wp):
+                if tracing.PARSE in tracing.active:
+                    tracing.event(tracing.PARSE, 'merging signals', wps=wps_to_merge, to=wp)
+                for wp_to_merge in wps_to_merge:
+                    wp_to_merge.merged = True
+                    self.merge_signals(wp_to_merge.signal, wp.signal)
+                    self.signaler.set_signal(wp_to_merge, wp.signal)
+                for lex_node in {wp.li for wp in self.signaler.word_parts}:
+                    lex_node.reindex_edges()
+                    # route stores are indexed by signals too
+                    lex_node.routes_down.reindex()
+
+    def should_merge_signals(self, wp):
+        top_route = next(wp.li.routes_down.with_head(wp), None)
+        wps_to_merge = set()
+        if top_route:
+            if top_route.arg and top_route.arg.wp.signal < wp.signal:
+                if tracing.PARSE in tracing.active:
+                    tracing.event(tracing.PARSE, 'signal merge of argument', wp=top_route.arg.wp, to=wp,
+                                  route=top_route)
+                wps_to_merge.add(top_route.arg.wp)
+                arg_part = top_route.arg.part
+                while arg_part:
+                    if tracing.PARSE in tracing.active:
+                        tracing.event(tracing.PARSE, 'signal merge of argument part', wp=arg_part.wp, to=wp)
+                    wps_to_merge.add(arg_part.wp)
+                    arg_part = arg_part.part
+            if top_route.wp.merged and top_route.part and False:
+                part = top_route.part
+                while part:
+                    if part.wp.signal != wp.signal:
+                        if tracing.PARSE in tracing.active:
+                            tracing.event(tracing.PARSE, 'signal merge of part', wp=part.wp, to=wp)
+                        wps_to_merge.add(part.wp)
+                    part = part.part
+            for adjunct in top_route.adjuncts:
+                if adjunct.wp.signal != wp.signal:
+                    if tracing.PARSE in tracing.active:
+                        tracing.event(tracing.PARSE, 'signal merge of adjunct', wp=adjunct.wp, to=wp)
+                    wps_to_merge.add(adjunct.wp)
+        return wps_to_merge
+
+    def add(self, node_class, label, *args, **kwargs):
+        if label in self.nodes:
+            return self.nodes[label]
+        node = node_class(label, *args, **kwargs)
+        self.nodes[label] = node
+        return node
+
+    def parse(self, sentence):
+        if not self.full_lexicon:
+            self.clear_grammar()
+            self.read_lexicon(self.lexicon_path, only_these=sentence.split())
+            self.build_grammar()
+        elif not self.lexicon:
+            self.read_lexicon(self.lexicon_path)
+            self.build_grammar()
+        self.signaler = Signaler(sentence.split(), self.lexicon)
+        self.parses.goal = self.signaler.signal_count
+        self.signaler.pick_first()
+        self.update_sentence()
+
+    def build_grammar(self):
+        self.merge = self.add(SymmetricMergeNode, 'M(A<?>B)')  # A→B
+        self.merge_pair = self.add(SymmetricPairMergeNode, 'M(A<->B)')
+        self.merge_ok = self.add(MergeOkNode, 'OK')
+        self.merge.connect(self.merge_ok)
+        self.merge_pair.connect(self.merge_ok)
+        sorted_features = sorted(self.features.values(), key=FeatureNode.sortable)
+        for feat_node in sorted_features:
+            if feat_node.sign == '=':
+                feat_node.connect(self.merge)
+                feat_node.connect_positive()
+            elif feat_node.sign == '-':
+                feat_node.connect(self.merge_pair)
+                feat_node.connect_positive()
+        for lex_node in self.lexicon.values():
+            lex_node.connect_lex_parts()
+        if self.use_activation_engine:
+            self.engine = ActivationEngine(self.nodes.values(), self.edges.values())
+
+    def clear_activations(self):
+        for node in self.nodes.values():
+            node.activations.clear()
+            node.active = False
+        for edge in self.edges.activated():
+            edge.activations.clear()
+        if self.engine:
+            self.engine.clear()
+
+    def show_current_routes(self):
+        if tracing.ROUTE_LISTS not in tracing.active:
+            return
+        c = 0
+        for word_part in self.signaler.word_parts:
+            tracing.event(tracing.ROUTE_LISTS, 'routes down', wp=word_part, count=len(word_part.li.routes_down))
+            for route in word_part.li.routes_down:
+                c += 1
+                if route.wp is not word_part:
+                    continue
+                tracing.event(tracing.ROUTE_LISTS, 'route', route=route, rs=route.rs, weight=route.weight,
+                              order=route.order)
+        tracing.event(tracing.ROUTE_LISTS, 'routes total', count=c)
+
+    def pick_optimal_route(self, k=None):
+        """ Return the k best routes that span the whole sentence without unused movers, or all of them, best
+        first. They have been collected as they were made, so other routes are gone through only when tracing. """
+        good_routes = self.parses.best(k)
+        if tracing.ROUTE_LISTS in tracing.active:
+            for word_part in self.signaler.word_parts:
+                tracing.event(tracing.ROUTE_LISTS, 'routes down', wp=word_part, count=len(word_part.li.routes_down))
+                for route in word_part.li.routes_down.with_head(word_part):
+                    tracing.event(tracing.ROUTE_LISTS, 'route', route=route, rs=route.rs, len=len(route),
+                                  signals=len(signals(route.wps)), weight=route.weight, order=route.order)
+        if tracing.PARSE in tracing.active:
+            for route in good_routes:
+                tracing.event(tracing.PARSE, 'good route', route=route, rs=route.rs, weight=route.weight,
+                              order=route.order, tree=route.tree())
+            total_routes = sum(1 for wp in self.signaler.word_parts for route in wp.li.routes_down.with_head(wp))
+            tracing.event(tracing.PARSE, 'total routes', count=total_routes)
+        return good_routes
+
+    def add_parse(self, route):
+        """ Keep route among the best parses if it is complete. With stop_at_first_parse the agenda stops here. """
+        if self.parses.is_complete(route):
+            position = next(i for i, wp in enumerate(self.signaler.word_parts) if wp is route.wp)
+            self.parses.add(route, position)
+            if self.stop_at_first_parse:
+                self.agenda.stop()
+
+    def add_route_edge(self, start, end, origin):
+        if not RouteEdge.exists(start, end, origin):
+            # route edges are made only here, a new one can't be in the list yet
+            end.li.route_edges.append(RouteEdge(start, end, origin))
@@ -1,11 +1,11 @@
 from collections import defaultdict
 
-from kivy.uix.label import Label
-from kivy.graphics import *
-
-from util import hue, find_edge, replace
-from edges import Edge, LexEdge, AdjunctEdge, MergeEdge
-from ctrl import ctrl, decay_threshold, decay_function
+import tracing
+from util import hue
+from edges import Edge, LexEdge, AdjunctEdge, MergeEdge, EdgeList, by_signals
+from ctrl import ctrl
+from activations import Activations, SignalMap, aliases
+from route_store import RouteStore
 
 
 class Node:
@@ -16,11 +16,11 @@ class Node:
     def __init__(self, id):
         self.id = id
         ctrl.nodes[id] = self
-        self.edges_out = []
-        self.edges_in = []
+        self.edges_out = EdgeList()
+        self.edges_in = EdgeList()
         self.x = 0
         self.y = 0
-        self.activations = {}
+        self.activations = Activations()
         self.active = False
         self.label_item = None
 
@@ -46,34 +46,27 @@ class Node:
         self.active = bool(self.activations)
 
     def decay(self):
-        for signal, strength in list(self.activations.items()):
-            new_strength = decay_function(strength)
-            if new_strength < decay_threshold:
-                del self.activations[signal]
-            else:
-                self.activations[signal] = new_strength
+        self.activations.purge()
 
     def deactivate(self):
         self.activations.clear()
         self.active = False
 
-    def merge_activations(self, old_value, new_value):
-        self.activations = replace(self.activations, old_value, new_value)
-        for edge in self.edges_out:
-            edge.merge_activations(old_value, new_value)
-
     def reset(self):
         self.deactivate()
 
-    def add_label(self):
-        self.label_item = Label(text=self.id)
+    def update_labels(self):
+        """ Create label widgets on first call and after that only update them. Returns the widgets. """
+        from kivy.uix.label import Label
+        if not self.label_item:
+            self.label_item = Label(text=self.id)
         self.label_item.x = self.x - 20
         self.label_item.y = self.y - 10
         if self.active:
             self.label_item.color = [1.0, 1.0, 0.4]
         else:
             self.label_item.color = [0.7, 0.7, 0.7]
-        ctrl.g.add_widget(self.label_item)
+        return [self.label_item]
 
     def set_pos(self, x, y):
         self.x = x
@@ -82,18 +75,22 @@ class Node:
             self.label_item.x = x
             self.label_item.y = y
 
+    def draw_state(self):
+        """ Everything draw depends on, node is drawn again only when this changes """
+        return self.x, self.y, tuple(self.activations.items())
+
     def draw(self):
-        with ctrl.g.canvas:
-            Color(*self.color)
-            r = 16
-            Line(circle=[self.x, self.y, r], width=1)
-            for activation, weight in self.activations.items():
-                if not isinstance(activation, tuple):
-                    activation = [activation]
-                for signal in activation:
-                    Color(hue(signal), 0.8, 0.5, mode='hsv')
-                    Line(circle=[self.x, self.y, r], width=weight * 5)
-                    r += weight * 5
+        from kivy.graphics import Color, Line
+        Color(*self.color)
+        r = 16
+        Line(circle=[self.x, self.y, r], width=1)
+        for activation, weight in self.activations.items():
+            if not isinstance(activation, tuple):
+                activation = [activation]
+            for signal in activation:
+                Color(hue(signal), 0.8, 0.5, mode='hsv')
+                Line(circle=[self.x, self.y, r], width=weight * 5)
+                r += weight * 5
 
 
 class LexicalNode(Node):
@@ -106,15 +103,16 @@ class LexicalNode(Node):
         self.categories = cats
         self.feats = feats
         self.selected_color = [0, 0.8, 0]
-        self.arg_edges = []
-        self.head_edges = []
-        self.adjunctions = []
-        self.adjunct_to = []
-        self.routes_down = []
+        self.arg_edges = EdgeList(by_signals)
+        self.head_edges = EdgeList(by_signals)
+        self.adjunctions = EdgeList(by_signals)
+        self.adjunct_to = EdgeList(by_signals)
+        self.routes_down = RouteStore()
         self.route_edges = []
         self.lex_parts = lex_parts
         self.order_counter = 0
         self.info_item = None
+        self.info_route_edges = None
         for f_node in feats:
             self.connect(f_node)
         for c_node in cats:
@@ -129,7 +127,8 @@ class LexicalNode(Node):
         self.active = bool(self.activations)
 
     def refresh_activation(self, n, strength):
-        print('refresh activation at ', self, n, strength)
+        if tracing.NODES in tracing.active:
+            tracing.event(tracing.NODES, 'refresh activation', node=self, signal=n, strength=strength)
         self.activate(n, strength)
 
     def count_routes_down(self):
@@ -145,8 +144,10 @@ class LexicalNode(Node):
         self.order_counter += 1
         return self.order_counter
 
-    def add_label(self):
-        self.label_item = Label(text=self.id)
+    def update_labels(self):
+        from kivy.uix.label import Label
+        if not self.label_item:
+            self.label_item = Label(text=self.id)
         self.label_item.x = self.x - 20
         self.label_item.y = self.y - 10
         signaler = ctrl.signaler
@@ -158,12 +159,17 @@ class LexicalNode(Node):
             self.label_item.color = [1.0, 1.0, 0.4]
         else:
             self.label_item.color = [0.7, 0.7, 0.7]
-        ctrl.g.add_widget(self.label_item)
-        self.info_item = Label(text=self.count_routes_down())
+        if not self.info_item:
+            self.info_item = Label(text='')
+            self.info_item.color = [0.7, 0.7, 0.7]
+        # route edges are only added between resets, and their signals change only when signals are merged
+        info_key = len(self.route_edges), aliases.version
+        if self.info_route_edges != info_key:
+            self.info_route_edges = info_key
+            self.info_item.text = self.count_routes_down()
         self.info_item.x = self.x - 20
         self.info_item.y = self.y - 50
-        self.info_item.color = [0.7, 0.7, 0.7]
-        ctrl.g.add_widget(self.info_item)
+        return [self.label_item, self.info_item]
 
     def connect_lex_parts(self):
         if len(self.lex_parts) == 1:
@@ -178,6 +184,11 @@ class LexicalNode(Node):
         if edge not in other.edges_in:
             other.edges_in.append(edge)
 
+    def reindex_edges(self):
+        """ Edges between word parts are found by signals, after merging signals they have to be found again """
+        for edges in (self.arg_edges, self.head_edges, self.adjunctions, self.adjunct_to):
+            edges.reindex()
+
     def has_mover_feature(self):
         for f_node in self.feats:
             if f_node.name == 'moves':
@@ -192,9 +203,9 @@ class LexicalNode(Node):
 
     @staticmethod
     def add_adjunction(head, adj):
-        if (find_edge(head.li.adjunctions, start=head, end=adj)
-           or find_edge(adj.li.adjunct_to, start=head, end=adj)):
-            print('  Nodes: exists already')
+        if head.li.adjunctions.find(head, adj) or adj.li.adjunct_to.find(head, adj):
+            if tracing.EDGES in tracing.active:
+                tracing.event(tracing.EDGES, 'adjunct edge exists already', head=head, adjunct=adj)
             return
         edge = AdjunctEdge(adj, head)
         head.li.adjunctions.append(edge)
@@ -202,7 +213,7 @@ class LexicalNode(Node):
 
     @staticmethod
     def add_merge(head, arg):
-        if find_edge(head.li.arg_edges, start=arg, end=head):
+        if head.li.arg_edges.find(arg, head):
             return
         edge = MergeEdge(arg, head)
         head.li.arg_edges.append(edge)
@@ -215,13 +226,12 @@ class FeatureNode(Node):
         self.sign = ''
         self.name = ''
         self.values = []
+        self.value_mask = 0
 
     def values_match(self, other):
         if not (self.values and other.values):
             return True
-        for f in self.values:
-            if f in other.values:
-                return f
+        return bool(self.value_mask & other.value_mask)
 
     def sortable(self):
         return self.name, ''.join(self.values), self.sign
@@ -239,8 +249,10 @@ class PosFeatureNode(FeatureNode):
         else:
             self.name = fstring
             self.values = []
+        self.value_mask = ctrl.g.value_mask(self.values)
         assert fstring not in ctrl.features
         ctrl.features[fstring] = self
+        ctrl.positive_features.setdefault(self.name, []).append(self)
 
     def activate(self, n, strength=1.0, source=None):
         if n not in self.activations:
@@ -266,18 +278,16 @@ class NegFeatureNode(FeatureNode):
         else:
             self.name = name_string
             self.values = []
+        self.value_mask = ctrl.g.value_mask(self.values)
         assert fstring not in ctrl.features
-        self.lex_activations = {}
-        self.feat_activations = {}
+        self.lex_activations = SignalMap()
+        self.feat_activations = SignalMap()
         ctrl.features[fstring] = self
 
     def connect_positive(self):
-        for feat in ctrl.features.values():
-            if feat.name == self.name \
-                    and not feat.sign \
-                    and feat is not self \
-                    and feat.values_match(self):
-               feat.connect(self)
+        for feat in ctrl.positive_features.get(self.name, ()):
+            if feat.values_match(self):
+                feat.connect(self)
 
     def activate(self, n, strength=1.0, source=None):
         if not self.activations:
@@ -313,11 +323,6 @@ class NegFeatureNode(FeatureNode):
                 if signal == head_signal:
                     return True
 
-    def merge_activations(self, old_value, new_value):
-        super(NegFeatureNode, self).merge_activations(old_value, new_value)
-        self.activations = replace(self.lex_activations, old_value, new_value)
-        self.activations = replace(self.feat_activations, old_value, new_value)
-
 
 class CategoryNode(Node):
     color = [0.5, 0.75, 0.75, 0.5]
@@ -336,59 +341,68 @@ class CategoryNode(Node):
 
 
 class MergeNode(Node):
+    """ Merge nodes get (head, arg) pairs from negative features and accept those that have the current word part's
+    signal in them. Accepted pairs are kept for the current signal only, so a new pair is accepted and passed on
+    without going through the pairs that came before it. """
     color = [1.0, 1.0, 0, .5]
 
+    def __init__(self, id):
+        super().__init__(id)
+        self.pending_signal = None
+        self.pending_pairs = set()
+
+    def accepts(self, n, source):
+        """ Return True if pair n came from a feature and has the current signal """
+        if not (source and isinstance(source.start, FeatureNode)):
+            return False
+        right_signal = ctrl.signaler.current_item.signal
+        if right_signal != self.pending_signal:
+            self.pending_signal = right_signal
+            self.pending_pairs = set()
+        return right_signal in n
+
+    def pass_on(self, n, strength):
+        """ Activate out edges with accepted pair n, once for each pair """
+        if n not in self.pending_pairs:
+            self.pending_pairs.add(n)
+            for out in self.edges_out:
+                out.activate(n, strength)
+
+    def deactivate(self):
+        super().deactivate()
+        self.pending_signal = None
+        self.pending_pairs = set()
+
 
 class SymmetricMergeNode(MergeNode):
     def activate(self, n, strength=1.0, source=None):
-        right_signal = ctrl.signaler.current_item.signal
-        accepted_signals = []
-        for e in self.edges_in:
-            if e.activations and isinstance(e.start, FeatureNode):
-                print('  Nodes: received activations:', e.activations)
-                for head_signal_in, arg_signal_in in e.activations:
-                    if arg_signal_in == right_signal:
-                        accepted_signals.append((head_signal_in, arg_signal_in))
-                    elif head_signal_in == right_signal:
-                        accepted_signals.append((head_signal_in, arg_signal_in))
-        print('  Nodes: accepted signals at symmetric merge: ', accepted_signals)
-        print('  Nodes: n: ', n)
-        if n in accepted_signals:
+        if tracing.NODES in tracing.active:
+            tracing.event(tracing.NODES, 'symmetric merge', node=self, signal=n, accepted=tuple(self.pending_pairs))
+        if self.accepts(n, source):
             if n not in self.activations:
                 self.activations[n] = strength
             else:
                 self.activations[n] += strength
-            print(f'  Nodes: at {self.id} adding left/right merge {n[0]}<->?{n[1]} where {n[0]} is head')
+            if tracing.NODES in tracing.active:
+                tracing.event(tracing.NODES, 'adding merge', node=self, head=n[0], arg=n[1])
             ctrl.g.add_merge(n[0], n[1])
-            for out in self.edges_out:
-                for n in accepted_signals:
-                    out.activate(n, strength)
+            self.pass_on(n, strength)
         self.active = bool(self.activations)
 
 
 class SymmetricPairMergeNode(MergeNode):
     def activate(self, n, strength=1.0, source=None):
-        right_signal = ctrl.signaler.current_item.signal
-        accepted_signals = []
-        for e in self.edges_in:
-            if e.activations and isinstance(e.start, FeatureNode):
-                for head_signal_in, arg_signal_in in e.activations:
-                    if arg_signal_in == right_signal:
-                        accepted_signals.append((head_signal_in, arg_signal_in))
-                    elif head_signal_in == right_signal:
-                        accepted_signals.append((head_signal_in, arg_signal_in))
-        print('  Nodes: accepted signals at symmetric merge: ', accepted_signals)
-        print('  Nodes: n: ', n)
-        if n in accepted_signals:
+        if tracing.NODES in tracing.active:
+            tracing.event(tracing.NODES, 'symmetric pair merge', node=self, signal=n, accepted=tuple(self.pending_pairs))
+        if self.accepts(n, source):
             if n not in self.activations:
                 self.activations[n] = strength
             else:
                 self.activations[n] += strength
-            print(f'  Nodes: at {self.id} adding pair merge {n[0]}<->?{n[1]} where {n[0]} is -')
+            if tracing.NODES in tracing.active:
+                tracing.event(tracing.NODES, 'adding pair merge', node=self, head=n[0], adjunct=n[1])
             ctrl.g.add_adjunction(n[0], n[1])
-            for out in self.edges_out:
-                for n in accepted_signals:
-                    out.activate(n, strength)
+            self.pass_on(n, strength)
         self.active = bool(self.activations)
 
 
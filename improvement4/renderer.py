@@ -0,0 +1,53 @@
+from kivy.graphics import Canvas
+
+
+class Renderer:
+    """ Retained mode drawing for the network. Every node and edge gets a canvas of its own that is kept between
+    updates and drawn again only when the item's draw_state() has changed. Labels are kept the same way, nodes only
+    update their texts, colors and positions. Items that are no longer shown lose their canvases and labels. Edges
+    are in a layer below nodes, and both are drawn before the widget's children, the buttons. """
+    def __init__(self, widget):
+        self.widget = widget
+        self.edge_layer = Canvas()
+        self.node_layer = Canvas()
+        widget.canvas.before.add(self.edge_layer)
+        widget.canvas.before.add(self.node_layer)
+        self.drawn = {}
+        self.labels = {}
+
+    def update(self, edges, nodes):
+        shown = set()
+        for edge in edges:
+            self.draw_item(edge, self.edge_layer)
+            shown.add(edge)
+        for node in nodes:
+            self.draw_item(node, self.node_layer)
+            shown.add(node)
+        for item in [item for item in self.drawn if item not in shown]:
+            canvas, state, layer = self.drawn.pop(item)
+            layer.remove(canvas)
+
+        labels = {}
+        for node in nodes:
+            for label in node.update_labels():
+                labels[id(label)] = label
+                if id(label) not in self.labels:
+                    self.widget.add_widget(label)
+        for key, label in self.labels.items():
+            if key not in labels:
+                self.widget.remove_widget(label)
+        self.labels = labels
+
+    def draw_item(self, item, layer):
+        state = item.draw_state()
+        if item in self.drawn:
+            canvas, old_state, layer = self.drawn[item]
+            if old_state == state:
+                return
+            canvas.clear()
+        else:
+            canvas = Canvas()
+            layer.add(canvas)
+        with canvas:
+            item.draw()
+        self.drawn[item] = canvas, state, layer
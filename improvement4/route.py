@@ -1,10 +1,14 @@
-from operator import attrgetter
+import weakref
 
+import tracing
+from activations import aliases
 from ctrl import ctrl
 from edges import LexEdge
-from route_signal import RouteSignal
+from route_signal import RouteSignal, bit
 
 BREAKPOINT = 0
+# walking routes up is switched off for the interactive network, batch.py turns it on
+WALK_ROUTES = False
 
 ARGUMENT = 'argument'
 LONG_DISTANCE_ARGUMENT = 'ld_argument'
@@ -12,28 +16,135 @@ ADJUNCTION = 'adjunction'
 PART = 'part'
 
 
+def signature(route):
+    """ Everything in a route that the checks in add_new_route look at """
+    return id(route.wp.li), route.wp.signal, route.rs.state(), route.arg is None, route.part is None
+
+
+class Agenda:
+    """ Walks routes up without recursion. Walking a route is a generator that stops after each combination it
+    tries, and the routes that the combination makes or finds again are walked before it goes on. That is the same
+    depth first order in which recursion walked them, so the same routes are made with the same weights, but the
+    stack of walks is a list instead of Python's call stack and long sentences don't hit the recursion limit. steps
+    counts the walks.
+
+    Combinations that failed are kept in a chart keyed by the relation and the signatures of the two routes: their
+    heads, spans, movers and what they already have. The checks depend only on those and on the order of word parts,
+    which changes only when signals are merged, and then the chart is emptied. A failed combination isn't checked
+    again, but any combination whose routes have changed since is. A stopped agenda walks nothing and tries no
+    combinations until it is cleared. """
+    def __init__(self):
+        self.stack = []
+        self.failed = set()
+        self.failed_version = aliases.version
+        self.running = False
+        self.stopped = False
+        self.steps = 0
+
+    def has_failed(self, key):
+        if self.failed_version != aliases.version:
+            self.failed.clear()
+            self.failed_version = aliases.version
+        return key in self.failed
+
+    def add_failure(self, key):
+        self.failed.add(key)
+
+    def walk(self, route):
+        if self.stopped:
+            return
+        self.steps += 1
+        self.stack.append(route.walk_up())
+        if self.running:
+            # the walk that made this route stops after the combination and this one goes first
+            return
+        self.running = True
+        try:
+            while self.stack:
+                try:
+                    next(self.stack[-1])
+                except StopIteration:
+                    self.stack.pop()
+        finally:
+            self.stack.clear()
+            self.running = False
+
+    def stop(self):
+        self.stopped = True
+        self.stack.clear()
+
+    def clear(self):
+        self.stack.clear()
+        self.failed.clear()
+        self.failed_version = aliases.version
+        self.running = False
+        self.stopped = False
+        self.steps = 0
+
+
+class RouteTable:
+    """ Intern table for routes. A route is made only once for each head word part and sub-routes, making it again
+    returns the route made before, so routes are equal only if they are the same object and can be kept in sets and
+    dicts. Sub-routes are interned before the routes made of them, so they are keys as themselves. Word parts are
+    keyed by id, as their signals, and so their hashes, change when signals are merged; the route in the entry keeps
+    its word part alive. The table holds routes weakly, so routes that no store or other route uses, such as those
+    the beam has dropped, are let go and memory follows the routes kept instead of the routes explored. """
+    def __init__(self):
+        self.routes = weakref.WeakValueDictionary()
+
+    def __iter__(self):
+        return iter(self.routes.values())
+
+    def __len__(self):
+        return len(self.routes)
+
+    def get(self, parent, wp=None, part=None, arg=None, adjunct=None):
+        """ Route(parent, wp, part, arg, adjunct), or the equal route if it has been made already """
+        if wp:
+            key = id(wp), None, None, ()
+        else:
+            key = (id(parent.wp), part or parent.part, arg or parent.arg,
+                   parent.adjuncts + (adjunct,) if adjunct else parent.adjuncts)
+        route = self.routes.get(key)
+        if route is None:
+            route = Route(parent, wp=wp, part=part, arg=arg, adjunct=adjunct)
+            self.routes[key] = route
+        return route
+
+    def clear(self):
+        self.routes.clear()
+
+
 class Route:
     """ A route is one possible parse of a sentence, composed of other routes. A route is more like a computational
     representation of parse for this stage where I don't know what is required for a parse, so it has lots of
-    superfluous information available.  """
+    superfluous information available.
+
+    Routes are never changed after they are created, apart from weight and order: a new route shares its parts,
+    argument and adjuncts with the route it was made from and stores only what the combination adds. Routes are
+    made through RouteTable, so equal routes are the same object and routes compare and hash by identity.
+
+    String forms are made when they are first asked for and kept, so a route's string is built from the kept strings
+    of its parts. Word parts are shown with their signals, so kept strings are thrown away when signals are merged. """
+    __slots__ = ('wp', 'part', 'arg', 'adjuncts', 'size', 'order', 'weight', 'wps', 'rs', 'strings_version',
+                 'printed', 'bracketed', 'labelled', '__weakref__')
+
     def __init__(self, parent, wp=None, part=None, arg=None, adjunct=None):
-        self.parent = parent
-        self.size = 0
         self.order = 0
         if wp:
             self.wp = wp
             self.part = None
             self.arg = None
-            self.adjuncts = []
+            self.adjuncts = ()
             self.size = 1
-            self.wps = {wp}
+            self.wps = bit(wp.signal)  # signals of the word parts in this route as a bitmask
         else:
             self.wp = parent.wp
             self.part = parent.part
             self.arg = parent.arg
-            self.adjuncts = list(parent.adjuncts)
+            self.adjuncts = parent.adjuncts
             self.size = parent.size
-            self.wps = set(parent.wps)
+            self.wps = parent.wps
         if part:
             self.part = part
             self.size += part.size
@@ -43,18 +154,12 @@ class Route:
             self.size += arg.size
             self.wps |= arg.wps
         if adjunct:
-            self.adjuncts.append(adjunct)
+            self.adjuncts += (adjunct,)
             self.size += adjunct.size
             self.wps |= adjunct.wps
         self.weight = 0
-        self.rs = RouteSignal(self, part and part.rs, arg and arg.rs, adjunct and adjunct.rs)
-
-    def __eq__(self, other):
-        if self is other:
-            return True
-        if not isinstance(other, Route):
-            return False
-        return self.wp == other.wp and self.part == other.part and self.arg == other.arg and self.adjuncts == other.adjuncts
+        self.strings_version = -1
+        self.rs = RouteSignal(self, parent and parent.rs, part and part.rs, arg and arg.rs, adjunct and adjunct.rs)
 
     def __len__(self):
         return self.size
@@ -81,53 +186,67 @@ class Route:
     def __repr__(self):
         return f'Route({self.print_route()})'
 
+    def check_strings(self):
+        if self.strings_version != aliases.version:
+            self.strings_version = aliases.version
+            self.printed = self.bracketed = self.labelled = None
+
     def print_route(self):
-        this = str(self.wp)
-        if self.adjuncts:
-            for adjunct in self.adjuncts:
-                if self.wp.signal < adjunct.wp.signal:
-                    this = f"({this}<+{adjunct})"
+        self.check_strings()
+        if self.printed is None:
+            this = str(self.wp)
+            if self.adjuncts:
+                for adjunct in self.adjuncts:
+                    if self.wp.signal < adjunct.wp.signal:
+                        this = f"({this}<+{adjunct.print_route()})"
+                    else:
+                        this = f"({adjunct.print_route()}+>{this})"
+            if self.arg:
+                if self.wp.signal < self.arg.wp.signal:
+                    this = f"({this}<-{self.arg.print_route()})"
                 else:
-                    this = f"({adjunct}+>{this})"
-        if self.arg:
-            if self.wp.signal < self.arg.wp.signal:
-                this = f"({this}<-{self.arg})"
-            else:
-                this = f"({self.arg}->{this})"
-        if self.part:
-            this = f"{this}.{self.part}"
-        return this
+                    this = f"({self.arg.print_route()}->{this})"
+            if self.part:
+                this = f"{this}.{self.part.print_route()}"
+            self.printed = this
+        return self.printed
 
-    def tree(self):
-        def _build_label(adjunct):
-            a_label = str(adjunct.wp)
-            for other_adjunct in adjunct.adjuncts:
-                adjunct_labels = _build_label(other_adjunct)
-                if adjunct.wp.signal < other_adjunct.wp.signal:
-                    a_label += '<+' + adjunct_labels
+    def adjunct_label(self):
+        """ Label of this route as an adjunct in a tree: its word part with its own adjuncts """
+        self.check_strings()
+        if self.labelled is None:
+            label = str(self.wp)
+            for other_adjunct in self.adjuncts:
+                if self.wp.signal < other_adjunct.wp.signal:
+                    label += '<+' + other_adjunct.adjunct_label()
                 else:
-                    a_label = adjunct_labels + '+>' + a_label
-            return a_label
+                    label = other_adjunct.adjunct_label() + '+>' + label
+            self.labelled = label
+        return self.labelled
 
-        label = str(self.wp)
-        this = label
-        if self.part:
-            this = f"[.{label} {self.wp} {self.part.tree()}]"
-        if self.adjuncts:
-            for adjunct in self.adjuncts:
-                if self.wp.signal < adjunct.wp.signal:
-                    label = f"{label}<+{_build_label(adjunct)}"
-                    this = f"[.{label} {this} {adjunct.tree()}]"
+    def tree(self):
+        """ Route as a bracket tree for Kataja """
+        self.check_strings()
+        if self.bracketed is None:
+            label = str(self.wp)
+            this = label
+            if self.part:
+                this = f"[.{label} {self.wp} {self.part.tree()}]"
+            if self.adjuncts:
+                for adjunct in self.adjuncts:
+                    if self.wp.signal < adjunct.wp.signal:
+                        label = f"{label}<+{adjunct.adjunct_label()}"
+                        this = f"[.{label} {this} {adjunct.tree()}]"
+                    else:
+                        label = f"{adjunct.adjunct_label()}+>{label}"
+                        this = f"[.{label} {adjunct.tree()} {this}]"
+            if self.arg:
+                if self.wp.signal < self.arg.wp.signal and not self.wp.li.is_free_to_move():
+                    this = f"[.{label} {this} {self.arg.tree()}]"
                 else:
-                    label = f"{_build_label(adjunct)}+>{label}"
-                    this = f"[.{label} {adjunct.tree()} {this}]"
-        if self.arg:
-            if self.wp.signal < self.arg.wp.signal and not self.wp.li.is_free_to_move():
-                return f"[.{label} {this} {self.arg.tree()}]"
-            else:
-                return f"[.{label} {self.arg.tree()} {this}]"
-        else:
-            return this
+                    this = f"[.{label} {self.arg.tree()} {this}]"
+            self.bracketed = this
+        return self.bracketed
 
     def add_route_edges(self):
         if self.arg:
@@ -140,124 +259,133 @@ class Route:
             for origin in range(self.part.rs.low, self.part.rs.high + 1):
                 ctrl.g.add_route_edge(self.part.wp, self.wp, origin)
 
-    def add_new_route(self, other_route, type=''):
-        new_combination = None
-        if self == other_route:
-            return
-        elif self.rs.routes_overlap(other_route.rs):
-            return
+    def combine(self, other_route, type):
+        """ Route made of this route and other_route in relation type, or None if they can't be combined """
+        if self.rs.routes_overlap(other_route.rs):
+            return None
         elif self.rs.used_movers & other_route.rs.used_movers:
-            return
+            return None
         elif type == ARGUMENT:
             if self.arg:
-                return
-            elif other_route.rs.head in other_route.rs.movers:
-                return
-            elif other_route.rs.head in self.rs.used_movers:
-                return
-            elif other_route.rs.head in self.rs.movers:
-                return
+                return None
+            elif other_route.rs.movers & bit(other_route.rs.head):
+                return None
+            elif (self.rs.used_movers | self.rs.movers) & bit(other_route.rs.head):
+                return None
             elif other_route.wp.li.is_free_to_move():
-                print('trying to use mover as common argument: ', other_route, self)
+                if tracing.ROUTES in tracing.active:
+                    tracing.event(tracing.ROUTES, 'mover as common argument', route=self, other=other_route)
                 raise hell
             elif self.wp.li.is_free_to_move():
-                print('trying to use mover as head: ', other_route, self)
+                if tracing.ROUTES in tracing.active:
+                    tracing.event(tracing.ROUTES, 'mover as head', route=self, other=other_route)
                 raise hell
             # Avoid splitting words
             elif other_route.rs.head < self.rs.head and self.wp.li.lex_parts.index(self.wp.li):
-                return
+                return None
             elif other_route.rs.are_neighbors(self.rs):
-                new_combination = Route(self, arg=other_route)
+                return ctrl.g.routes.get(self, arg=other_route)
         elif type == LONG_DISTANCE_ARGUMENT:
             if self.arg:
-                return
+                return None
             elif other_route.rs.is_lower_neighbor_due_movement_for(self.rs):
-                print('long distance argument: ', other_route, self)
-                new_combination = Route(self, arg=other_route)
+                if tracing.ROUTES in tracing.active:
+                    tracing.event(tracing.ROUTES, 'long distance argument', route=self, other=other_route)
+                return ctrl.g.routes.get(self, arg=other_route)
             elif self.rs.is_lower_neighbor_due_movement_for(other_route.rs):
-                print('reversed long distance argument: ', other_route, self)
-                new_combination = Route(self, arg=other_route)
+                if tracing.ROUTES in tracing.active:
+                    tracing.event(tracing.ROUTES, 'reversed long distance argument', route=self, other=other_route)
+                return ctrl.g.routes.get(self, arg=other_route)
         elif type == ADJUNCTION:
             if other_route.rs.are_neighbors(self.rs):
-                new_combination = Route(self, adjunct=other_route)
+                return ctrl.g.routes.get(self, adjunct=other_route)
         elif type == PART:
             if self.wp.signal > other_route.wp.signal:
-                return
+                return None
             if self.part:
-                return
-            new_combination = Route(self, part=other_route)
+                return None
+            return ctrl.g.routes.get(self, part=other_route)
+        return None
+
+    def add_new_route(self, other_route, type=''):
+        if self is other_route or ctrl.g.agenda.stopped:
+            return
+        key = type, signature(self), signature(other_route)
+        if ctrl.g.agenda.has_failed(key):
+            return
+        new_combination = self.combine(other_route, type)
         if not new_combination:
+            ctrl.g.agenda.add_failure(key)
             return
-        old_combination = None
-        for combination in self.wp.li.routes_down:
-            if combination == new_combination:
-                old_combination = combination
-                break
-            elif combination.rs.same_scope(new_combination.rs):
-                old_combination = combination
-                break
+        old_combination = self.wp.li.routes_down.find_duplicate(new_combination)
         if type == ADJUNCTION:
             if new_combination not in other_route.wp.li.routes_down:
-                print('adding adjunction also to adjuncted route: ', other_route.wp, other_route, new_combination, new_combination.wp)
+                if tracing.ROUTES in tracing.active:
+                    tracing.event(tracing.ROUTES, 'adjunction to adjuncted route', adjunct=other_route,
+                                route=new_combination)
                 #raise hell
-                other_route.wp.li.routes_down.insert(0, new_combination)
-                other_route.wp.li.routes_down.sort(key=attrgetter('size', 'weight'), reverse=True)
+                other_route.wp.li.routes_down.add(new_combination)
         if old_combination:
-            old_combination.weight += 1
+            self.wp.li.routes_down.add_weight(old_combination)
+            ctrl.g.add_parse(old_combination)
             old_combination.walk_all_routes_up()
         else:
-            print(f'  {self.sg}: ({type}) add_new_route: {self} ({self.rs})')
-            print(f'  {self.sg}:               {other_route} ({other_route.rs})')
-            print(f'  {self.sg}:            => {new_combination}')
-            print(f'  {self.sg}:  new combination: {new_combination} ({new_combination.rs})')
-            new_combination.add_route_edges()
             new_combination.weight = self.weight + other_route.weight
+            if ctrl.g.beam and not ctrl.g.beam.admit(self.wp.li.routes_down, new_combination):
+                if tracing.ROUTES in tracing.active:
+                    tracing.event(tracing.ROUTES, 'pruned route', new=new_combination, rs=new_combination.rs)
+                return
+            if tracing.ROUTES in tracing.active:
+                tracing.event(tracing.ROUTES, 'new route', type=type, route=self, other=other_route,
+                            new=new_combination, rs=new_combination.rs)
+            new_combination.add_route_edges()
             new_combination.order = self.wp.li.get_next_order_counter()
-            self.wp.li.routes_down.insert(0, new_combination)
-            self.wp.li.routes_down.sort(key=attrgetter('size', 'weight'), reverse=True)
+            self.wp.li.routes_down.add(new_combination)
+            ctrl.g.add_parse(new_combination)
 
             new_combination.walk_all_routes_up()
 
     def walk_all_routes_up(self):
-        return
+        if WALK_ROUTES:
+            ctrl.g.agenda.walk(self)
+
+    def walk_up(self):
+        """ Try to combine this route with routes of its possible heads. This is a generator that stops after each
+        combination, so that Agenda can walk the routes it made first. """
         ctrl.g.counter += 1
-        print(f'------ {ctrl.g.counter} ------')
-        print(f' {self.sg}: walking all routes up from: ', self)
+        if tracing.ROUTES in tracing.active:
+            tracing.event(tracing.ROUTES, 'walking up', counter=ctrl.g.counter, route=self)
         wp = min([self.wp] + [route.wp for route in self.adjuncts])
         for edge in wp.li.edges_in:
             if isinstance(edge, LexEdge) and edge.activations:
                 for other_route in edge.start.routes_down:
                     other_route.add_new_route(self, PART)
+                    yield
 
         for edge in self.wp.li.adjunct_to:
-            print('maybe adjunct to ', edge.start, '?')
             if edge.start != self.wp:
                 continue
             other = edge.end
             if self.rs.low <= other.signal <= self.rs.high:
                 continue
-            for other_route in other.li.routes_down:
-                if other == other_route.wp:
-                    other_route.add_new_route(self, ADJUNCTION)
+            for other_route in other.li.routes_down.with_head(other):
+                other_route.add_new_route(self, ADJUNCTION)
+                yield
 
         if self.wp.merged:
-            print(f'  wp {self.wp} is already merged and is inactive')
+            if tracing.ROUTES in tracing.active:
+                tracing.event(tracing.ROUTES, 'merged word part is inactive', wp=self.wp)
             return
 
-        if not self.wp.li.head_edges:
-            print('no head edges from ', self.wp.li)
         for edge in self.wp.li.head_edges:
-            print('head edge: ', edge)
-            for other_route in edge.head.li.routes_down:
-                print('route candidate: ', other_route)
-                if edge.head == other_route.wp:
-                    other_route.add_new_route(self, ARGUMENT)
+            for other_route in edge.head.li.routes_down.with_head(edge.head):
+                other_route.add_new_route(self, ARGUMENT)
+                yield
 
         for edge in self.wp.li.head_edges:
-            for other_route in edge.head.li.routes_down:
-                if edge.head == other_route.wp:
-                    other_route.add_new_route(self, LONG_DISTANCE_ARGUMENT)
+            for other_route in edge.head.li.routes_down.with_head(edge.head):
+                other_route.add_new_route(self, LONG_DISTANCE_ARGUMENT)
+                yield
 
-        print(f' {self.sg}: done checking routes from {self}')
         if ctrl.g.counter == BREAKPOINT:
             print('**** at breakpoint ****')
@@ -1,66 +1,128 @@
+import tracing
+from activations import aliases
 from ctrl import ctrl
 
 
+def bit(signal):
+    """ Signals are small positive integers, so sets of them are kept as bitmasks where signal n is bit n """
+    return 1 << signal
+
+
+def signals(mask):
+    """ Set of signals in bitmask, for printing """
+    return {signal for signal in range(mask.bit_length()) if mask >> signal & 1}
+
+
 class RouteSignal:
     """ RouteSignal is a minimal representation of Route that should eventually replace Route. Parsing should be
-    possible by doing computation in nodes with RouteSignals representing the parse states."""
-    def __init__(self, route, part, arg, adjunct):
-        self.route = route
+    possible by doing computation in nodes with RouteSignals representing the parse states.
+
+    Merged signals are followed like in SignalMap: head, low and high made before the latest merge are looked up
+    from activations.aliases the next time they are read, so merging doesn't have to go through the routes."""
+    __slots__ = ('_head', '_low', '_high', 'version', 'movers', 'used_movers')
+
+    def __init__(self, route, parent, part, arg, adjunct):
+        self.version = aliases.version
         self.head = route.wp.signal
-        if route.parent:
-            self.low = route.parent.rs.low
-            self.high = route.parent.rs.high
-            self.movers = set(route.parent.rs.movers)
-            self.used_movers = set(route.parent.rs.used_movers)
+        if parent:
+            self.low = parent.low
+            self.high = parent.high
+            self.movers = parent.movers
+            self.used_movers = parent.used_movers
         else:
             self.low = self.head
             self.high = self.head
-            self.movers = {self.head} if route.wp.li.is_free_to_move() else set()
-            self.used_movers = set()
+            self.movers = bit(self.head) if route.wp.li.is_free_to_move() else 0
+            self.used_movers = 0
         if part:
-            print('     rs: adding part ', part.route, part, ' to ', route.parent, self)
             self.movers |= part.movers
             self.used_movers |= part.used_movers
             self.high = part.high
         if arg:
-            print('     rs: adding argument ', arg.route, arg, ' to ', route.parent, self)
-            if self.movers or arg.movers:
-                print(' rs: arg w. mover:', self.movers, arg.movers, arg.route.wp, route.wp)
-            if self.head in self.movers:
-                self.movers.remove(self.head)
-                self.used_movers.add(self.head)
-            self.movers -= arg.used_movers
+            head_bit = bit(self.head)
+            if self.movers & head_bit:
+                self.movers &= ~head_bit
+                self.used_movers |= head_bit
+            self.movers &= ~arg.used_movers
             self.used_movers |= arg.used_movers
-            if arg.head in self.movers:
-                print('     rs: **** using and removing mover from self')
-                self.movers.remove(arg.head)
-                self.used_movers.add(arg.head)
-            elif arg.head in arg.movers:
-                print('     rs: ** merging mover argument, skip it from lowest count. arg: ', arg)
-                self.used_movers.add(arg.head)
+            arg_bit = bit(arg.head)
+            if self.movers & arg_bit:
+                if tracing.ROUTE_SIGNALS in tracing.active:
+                    tracing.event(tracing.ROUTE_SIGNALS, 'using mover', route=route, mover=arg.head)
+                self.movers &= ~arg_bit
+                self.used_movers |= arg_bit
+            elif arg.movers & arg_bit:
+                if tracing.ROUTE_SIGNALS in tracing.active:
+                    tracing.event(tracing.ROUTE_SIGNALS, 'mover argument skipped from low', route=route, arg=arg)
+                self.used_movers |= arg_bit
             else:
                 self.low = min(self.low, arg.low)
             self.high = max(self.high, arg.high)
         if adjunct:
-            print('     rs: adding adjunct ', adjunct.route, adjunct, ' to ', route.parent, self)
             self.low = min(self.low, adjunct.low)
             self.high = max(self.high, adjunct.high)
             if adjunct.movers:
-                self.movers.add(self.head)
-                print('     rs: adding ', self.head, ' to movers', self.movers)
-        print('rs result: ', self)
+                self.movers |= bit(self.head)
+                if tracing.ROUTE_SIGNALS in tracing.active:
+                    tracing.event(tracing.ROUTE_SIGNALS, 'head becomes mover', route=route, head=self.head)
+        if tracing.ROUTE_SIGNALS in tracing.active:
+            tracing.event(tracing.ROUTE_SIGNALS, 'route signal', parent=parent, part=part, arg=arg, adjunct=adjunct,
+                        result=self)
+
+    def follow_aliases(self):
+        self._head = aliases.find(self._head)
+        self._low = aliases.find(self._low)
+        self._high = aliases.find(self._high)
+        self.version = aliases.version
+
+    def state(self):
+        """ head, low, high, movers and used movers, with one look at the aliases """
+        if self.version != aliases.version:
+            self.follow_aliases()
+        return self._head, self._low, self._high, self.movers, self.used_movers
+
+    @property
+    def head(self):
+        if self.version != aliases.version:
+            self.follow_aliases()
+        return self._head
+
+    @head.setter
+    def head(self, signal):
+        self._head = signal
+
+    @property
+    def low(self):
+        if self.version != aliases.version:
+            self.follow_aliases()
+        return self._low
+
+    @low.setter
+    def low(self, signal):
+        self._low = signal
+
+    @property
+    def high(self):
+        if self.version != aliases.version:
+            self.follow_aliases()
+        return self._high
+
+    @high.setter
+    def high(self, signal):
+        self._high = signal
 
     def __repr__(self):
-        return f'<RouteSignal low:{self.low}, head: {self.head} high:{self.high}, movers:{self.movers}, ' \
-               f'used:{self.used_movers}>'
+        return f'<RouteSignal low:{self.low}, head: {self.head} high:{self.high}, movers:{signals(self.movers)}, ' \
+               f'used:{signals(self.used_movers)}>'
 
     def is_lower_neighbor_due_movement_for(self, other):
         if self.head == other.head:
             return False
-        if (self.head in self.movers  # 1. must be mover
+        head_bit = bit(self.head)
+        if (self.movers & head_bit  # 1. must be mover
               and self.high < other.low  # 2. must not be contained in where it is moved
-              and self.head not in other.used_movers  # 3. mover must not be used
-              and self.head not in other.movers):  # 4. mover must not be same structure (prob. not necessary because 2.)
+              and not other.used_movers & head_bit  # 3. mover must not be used
+              and not other.movers & head_bit):  # 4. mover must not be same structure (prob. not necessary because 2.)
             return True
         return False
 
@@ -70,26 +132,7 @@ class RouteSignal:
     def is_lower_neighbor_of(self, other):
         if self.head == other.head:
             return False
-        prev = None
-        print(f'{self.high}({self.head})<{other.low}({other.head})? {[wp.signal for wp in ctrl.words.word_parts]}')
-        for wp in ctrl.words.word_parts:
-            if prev and prev.signal == self.high:
-                if wp.signal == other.low:
-                    print('ok')
-                    return True
-            elif wp.signal == other.low:
-                return False
-            prev = wp
-        return False
-
-    def merge_signals(self, old_signal, new_signal):
-        print(f'going to merge signal {old_signal} to {new_signal} in {self} ({self.route})')
-        if self.head == old_signal:
-            self.head = new_signal
-        if self.low == old_signal:
-            self.low = new_signal
-        if self.high == old_signal:
-            self.high = new_signal
+        return ctrl.signaler.is_preceded_by(other.low, self.high)
 
     def same_scope(self, other):
         return self.low == other.low and self.high == other.high and self.movers == other.movers and self.used_movers == other.used_movers
@@ -0,0 +1,182 @@
+from heapq import heappush, heappop
+
+
+def sort_key(route):
+    """ Biggest and heaviest routes first """
+    return -route.size, -route.weight
+
+
+def scope_key(route):
+    rs = route.rs
+    return rs.low, rs.high, rs.movers, rs.used_movers
+
+
+def equality_key(route):
+    """ Routes built from the same sub-routes are equal. Sub-routes are compared by identity, which is exact as routes
+    are interned in RouteTable. Heads are compared by signal, so a word part merged to the head counts as the head. """
+    return route.wp.signal, id(route.part), id(route.arg), tuple(id(adjunct) for adjunct in route.adjuncts)
+
+
+class RouteStore:
+    """ Routes down from a lexical node, kept in a list in (size, weight) order like the plain list it replaces: a new
+    route is put first and the list sorted again, while weight changes only take effect at the next sort. Iteration
+    is live, so routes added while looping are visited. Routes can also be found by their scope (low, high, movers,
+    used movers) and by their parts without scanning the whole list. """
+    def __init__(self):
+        self.routes = []
+        self.members = set()
+        self.scopes = {}
+        self.equals = {}
+
+    def __iter__(self):
+        return iter(self.routes)
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __bool__(self):
+        return bool(self.routes)
+
+    def __contains__(self, route):
+        return equality_key(route) in self.equals
+
+    def __repr__(self):
+        return repr(self.routes)
+
+    def add(self, route):
+        """ Put route first and sort the list again """
+        self.routes.insert(0, route)
+        self.routes.sort(key=sort_key)
+        self.add_to_indexes(route)
+
+    def append(self, route):
+        """ Put route last without sorting, as leaf routes are """
+        self.routes.append(route)
+        self.add_to_indexes(route)
+
+    def add_to_indexes(self, route):
+        self.members.add(id(route))
+        self.scopes.setdefault(scope_key(route), []).append(route)
+        self.equals.setdefault(equality_key(route), []).append(route)
+
+    def add_weight(self, route, weight=1):
+        """ Change route's weight. It moves to its new place when the list is sorted next time. """
+        route.weight += weight
+
+    def remove(self, route):
+        """ Remove route from the store and its indexes """
+        if id(route) not in self.members:
+            return
+        self.members.discard(id(route))
+        self.routes = [other for other in self.routes if other is not route]
+        for index, key in ((self.scopes, scope_key(route)), (self.equals, equality_key(route))):
+            routes = [other for other in index.get(key, ()) if other is not route]
+            if routes:
+                index[key] = routes
+            else:
+                index.pop(key, None)
+
+    def holds(self, route):
+        """ Is this very route in the store, not just one equal to it """
+        return id(route) in self.members
+
+    def with_head(self, wp):
+        """ Routes where wp is the head, in list order """
+        return (route for route in self.routes if route.wp == wp)
+
+    def find_duplicate(self, route):
+        """ Return the first route in the list that is equal to route or covers the same scope """
+        candidates = self.equals.get(equality_key(route), []) + self.scopes.get(scope_key(route), [])
+        if len(candidates) < 2:
+            return candidates[0] if candidates else None
+        return min(candidates, key=self.routes.index)
+
+    def reindex(self):
+        """ Rebuild the indexes after signals in routes have changed """
+        self.members.clear()
+        self.scopes.clear()
+        self.equals.clear()
+        for route in self.routes:
+            self.add_to_indexes(route)
+
+    def clear(self):
+        self.routes.clear()
+        self.members.clear()
+        self.scopes.clear()
+        self.equals.clear()
+
+
+class Beam:
+    """ Keeps at most width routes for each head word part in a route store. A new route gets in if there is room
+    or if it scores better than the worst route for its head, which is then dropped. Lower scores are better, the
+    default is sort_key, biggest and heaviest first. pruned counts the routes that were turned away or dropped. """
+    def __init__(self, width, score=sort_key):
+        self.width = width
+        self.score = score
+        self.pruned = 0
+
+    def admit(self, store, route):
+        """ Return True if route can be added to store, making room for it if needed """
+        head_routes = list(store.with_head(route.wp))
+        if len(head_routes) < self.width:
+            return True
+        self.pruned += 1
+        worst = max(head_routes, key=self.score)
+        if self.score(route) < self.score(worst):
+            store.remove(worst)
+            return True
+        return False
+
+    def clear(self):
+        self.pruned = 0
+
+
+class BestParses:
+    """ Routes that span the whole sentence without unused movers, registered when they are made and kept in a heap
+    so that the best k are found without looking at other routes. The order is that of the old end of sentence scan:
+    biggest and heaviest first, then by the position of the head word part, newest first. A route whose weight grows
+    is pushed again and its old entry is skipped when popped, as are routes that the beam has dropped. """
+    def __init__(self):
+        self.goal = 0  # number of word parts in the sentence
+        self.heap = []
+        self.keys = {}  # id(route) -> key of its latest heap entry
+        self.ranked = []
+        self.count = 0
+
+    def is_complete(self, route):
+        return route.size == self.goal and not route.rs.movers
+
+    def add(self, route, position):
+        """ Register a complete route, or push it again after its weight has changed. position is the place of its
+        head word part in the sentence. """
+        if self.ranked:
+            # route may be better than the ones already ranked, rank them again
+            for ranked in self.ranked:
+                heappush(self.heap, (self.keys[id(ranked)], ranked))
+            self.ranked = []
+        self.push(route, position)
+
+    def push(self, route, position):
+        self.count += 1
+        key = sort_key(route) + (position, -self.count)
+        self.keys[id(route)] = key
+        heappush(self.heap, (key, route))
+
+    def valid(self, entry):
+        key, route = entry
+        return self.keys.get(id(route)) == key and route.wp.li.routes_down.holds(route)
+
+    def best(self, k=None):
+        """ The k best parses, or all of them, best first """
+        self.ranked = [route for route in self.ranked if route.wp.li.routes_down.holds(route)]
+        while self.heap and (k is None or len(self.ranked) < k):
+            entry = heappop(self.heap)
+            if self.valid(entry):
+                self.ranked.append(entry[1])
+        return self.ranked[:k]
+
+    def clear(self):
+        self.heap.clear()
+        self.keys.clear()
+        self.ranked = []
+        self.count = 0
@@ -0,0 +1,97 @@
+""" Local parse server. Keeps a pool of worker processes, each with the whole lexicon read and the network built, so
+a request costs only the parsing. Requests and responses are JSON, one object per line:
+
+    {"sentence": "Pekka ihailee Merjaa"}
+    {"sentences": ["Pekka ihailee Merjaa", "Merja ihailee Pekkaa"]}
+
+are answered with
+
+    {"results": [{"sentence": ..., "word_parts": [...], "routes": [{"route": ..., "tree": ..., ...}]}]}
+
+where the trees are the same ones main.py sends to Kataja. A bad request is answered with {"error": ...} and the
+connection stays open. Every connection gets its own thread, and parsing is shared between the workers. """
+import argparse
+import json
+import os
+import socketserver
+import sys
+
+from batch import LEXICON_PATH, create_pool, parse_in_pool
+
+HOST, PORT = '127.0.0.1', 62237
+
+
+class ParseHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                response = {'results': parse_in_pool(self.server.pool, sentences_in(json.loads(line)))}
+            except (ValueError, TypeError) as e:
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def sentences_in(request):
+    if not isinstance(request, dict):
+        raise ValueError('request should be a JSON object')
+    if 'sentence' in request:
+        sentences = [request['sentence']]
+    elif 'sentences' in request:
+        sentences = request['sentences']
+    else:
+        raise ValueError('request should have "sentence" or "sentences"')
+    if not isinstance(sentences, list) or not all(isinstance(sentence, str) for sentence in sentences):
+        raise ValueError('sentences should be strings')
+    return sentences
+
+
+class ParseServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, pool):
+        self.pool = pool
+        super().__init__(address, ParseHandler)
+
+
+class UnixParseServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        super().__init__(path, ParseHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve parses over a local socket.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', help='listen on this unix socket path instead of TCP')
+    parser.add_argument('--lexicon', default=LEXICON_PATH)
+    parser.add_argument('--processes', type=int, default=0, help='number of parsing workers, 0 uses all cores')
+    args = parser.parse_args()
+    # lexicon is read once for the whole server life, so it has to be the full lexicon
+    with create_pool(args.processes or None, args.lexicon, full_lexicon=True) as pool:
+        if args.unix:
+            if os.path.exists(args.unix):
+                os.remove(args.unix)
+            server = UnixParseServer(args.unix, pool)
+            print(f'parse server listening at {args.unix}', file=sys.stderr)
+        else:
+            server = ParseServer((args.host, args.port), pool)
+            print(f'parse server listening at {args.host}:{args.port}', file=sys.stderr)
+        with server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import tracing
 from word_part import WordPart
 
 
@@ -7,6 +8,9 @@ class Signaler:
         self.words_left = list(reversed(words))
         self.lexicon = lexicon
         self.word_parts = []
+        self.first_wps = {}
+        self.last_wps = {}
+        self.predecessors = {}
         self.current_item = None
         self.prev_items = []
         self.closest_item = None
@@ -18,13 +22,52 @@ class Signaler:
         self.current_item = None
         self.closest_item = None
         self.word_parts = []
+        self.first_wps.clear()
+        self.last_wps.clear()
+        self.predecessors.clear()
 
     def get_by_signal(self, signal):
         return self.word_parts[signal - 1]
 
+    def get_first_wp(self, signal):
+        return self.first_wps.get(signal)
+
+    def get_last_wp(self, signal):
+        return self.last_wps.get(signal)
+
+    def get_lex_item(self, signal):
+        wp = self.last_wps.get(signal)
+        return wp.li if wp else None
+
+    def is_preceded_by(self, signal, prev_signal):
+        """ Is the first word part with signal right after a word part with prev_signal """
+        return signal in self.predecessors and self.predecessors[signal] == prev_signal
+
+    def add_word_part(self, wp):
+        if wp.signal not in self.first_wps:
+            self.first_wps[wp.signal] = wp
+            if self.word_parts:
+                self.predecessors[wp.signal] = self.word_parts[-1].signal
+        self.last_wps[wp.signal] = wp
+        self.word_parts.append(wp)
+
+    def set_signal(self, wp, signal):
+        """ Give word part a new signal and keep the signal indexes up to date """
+        wp.signal = signal
+        self.reindex()
+
+    def reindex(self):
+        word_parts = self.word_parts
+        self.word_parts = []
+        self.first_wps.clear()
+        self.last_wps.clear()
+        self.predecessors.clear()
+        for wp in word_parts:
+            self.add_word_part(wp)
+
     def pick_first(self):
         self.current_item = WordPart(self.lexicon[self.words_left.pop()], 1)
-        self.word_parts.append(self.current_item)
+        self.add_word_part(self.current_item)
         return self.current_item
 
     def get_lex_parts(self, word_part):
@@ -48,12 +91,14 @@ class Signaler:
         li = self.current_item.li
         i = li.lex_parts.index(li)
         # self.closest_item = self.current_item
+        # signals are given by position, merged word parts give their signals away and those aren't reused
+        signal = len(self.word_parts) + 1
         if i < len(li.lex_parts) - 1:
-            self.current_item = WordPart(li.lex_parts[i + 1], self.current_item.signal + 1)
-            self.word_parts.append(self.current_item)
+            self.current_item = WordPart(li.lex_parts[i + 1], signal)
+            self.add_word_part(self.current_item)
         elif self.words_left:
-            self.current_item = WordPart(self.lexicon[self.words_left.pop()], self.current_item.signal + 1)
-            self.word_parts.append(self.current_item)
+            self.current_item = WordPart(self.lexicon[self.words_left.pop()], signal)
+            self.add_word_part(self.current_item)
         else:
             self.current_item = None
         self.prev_items = self.collect_previous_items() if self.current_item else []
@@ -74,12 +119,15 @@ class Signaler:
         # return [part for part in self.word_parts if part.li not in current_parts]
         return self.word_parts[:-1]
 
-    def activate_current_words(self):
-        lefts = list(reversed(self.prev_items))
+    def activate_current_words(self, engine=None):
         current = self.current_item
-        print(f' Signaler: *** activate {lefts} & {current}')
+        if tracing.WORDS in tracing.active:
+            tracing.event(tracing.WORDS, 'activate', lefts=list(reversed(self.prev_items)), current=current)
         strength = 1.0
-        current.li.activate(current.signal, strength=strength)
+        if engine:
+            engine.activate(current.li, current.signal, strength=strength)
+        else:
+            current.li.activate(current.signal, strength=strength)
         # for left in list(reversed(lefts))[:2]:
         #    strength = strength * 0.9
         #    left.li.refresh_activation(left.signal, strength)
@@ -0,0 +1,62 @@
+""" Tests for CompiledLexicon falling back to recompiling a broken compiled file. Run with
+python -m unittest test_compiled_lexicon in this directory. """
+import os
+import shutil
+import tempfile
+import unittest
+
+from compiled_lexicon import CompiledLexicon, MAGIC, HEADER
+
+LEXICON = '''# test lexicon
+Pekka :: N a:3sg
+sanoi :: =N V, -N
+'''
+ENTRIES = [('Pekka', [[['N', 'a:3sg']]]), ('sanoi', [[['=N', 'V'], ['-N']]])]
+
+
+class TestCompiledLexicon(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.dir, 'lexicon.txt')
+        with open(self.source_path, 'w') as out_file:
+            out_file.write(LEXICON)
+        self.compiled_path = self.source_path + '.compiled'
+        CompiledLexicon(self.source_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rewrite_compiled(self, change):
+        with open(self.compiled_path, 'rb') as in_file:
+            data = in_file.read()
+        with open(self.compiled_path, 'wb') as out_file:
+            out_file.write(change(data))
+
+    def assert_recompiled(self):
+        lexicon = CompiledLexicon(self.source_path)
+        self.assertIsNone(lexicon.in_memory)
+        self.assertEqual(list(lexicon.entries()), ENTRIES)
+
+    def test_reads_compiled(self):
+        self.assert_recompiled()
+
+    def test_truncated_entries(self):
+        self.rewrite_compiled(lambda data: data[:-3])
+        self.assert_recompiled()
+
+    def test_truncated_index(self):
+        self.rewrite_compiled(lambda data: data[:len(MAGIC) + HEADER.size + 2])
+        self.assert_recompiled()
+
+    def test_corrupt_index(self):
+        start = len(MAGIC) + HEADER.size
+        self.rewrite_compiled(lambda data: data[:start] + b'\xff' * 4 + data[start + 4:])
+        self.assert_recompiled()
+
+    def test_other_python(self):
+        self.rewrite_compiled(lambda data: b'NodeMerge lexicon 2 other-3.0 marshal 0\n' + data[len(MAGIC):])
+        self.assert_recompiled()
+
+
+if __name__ == '__main__':
+    unittest.main()
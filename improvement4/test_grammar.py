@@ -0,0 +1,24 @@
+""" Tests for Grammar, run headless through BatchParser. Run with python -m unittest test_grammar in this
+directory. """
+import unittest
+
+from batch import BatchParser
+
+
+class TestClearActivations(unittest.TestCase):
+    def test_clear_activations_after_parse(self):
+        # main.py clears activations before reset when moving to another sentence, while merge and adjunct edges of
+        # the parsed sentence are still there
+        parser = BatchParser()
+        parser.parse_sentence('väite jonka Pekka sanoi hylättiin')
+        self.assertTrue(parser.edges.merge_edges)
+        parser.clear_activations()
+        for node in parser.nodes.values():
+            self.assertFalse(node.activations)
+            self.assertFalse(node.active)
+        for edge in parser.edges.activated():
+            self.assertFalse(edge.activations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+""" Tests for KatajaChannel against a stub listener standing in for Kataja. Run with
+python -m unittest test_kataja_channel in this directory. """
+import json
+import socket
+import threading
+import time
+import unittest
+
+from kataja_channel import KatajaChannel
+
+
+class StubListener:
+    """ Accepts one connection and collects the JSON lines written to it until the connection is closed """
+    def __init__(self, port=0):
+        self.server = socket.socket()
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', port))
+        self.server.listen(1)
+        self.address = self.server.getsockname()
+        self.messages = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        conn, _ = self.server.accept()
+        with conn, conn.makefile('rb') as lines:
+            for line in lines:
+                self.messages.append(json.loads(line))
+        self.server.close()
+
+
+def free_address():
+    """ Address where nobody is listening, yet """
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    address = sock.getsockname()
+    sock.close()
+    return address
+
+
+def wait_until(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestKatajaChannel(unittest.TestCase):
+    def test_sends_messages_in_order(self):
+        listener = StubListener()
+        channel = KatajaChannel(listener.address)
+        for i in range(50):
+            channel.send({'i': i})
+        channel.close()
+        self.assertFalse(channel.thread.is_alive())
+        self.assertIsNone(channel.sock)
+        listener.thread.join(5.0)
+        self.assertEqual(listener.messages, [{'i': i} for i in range(50)])
+        self.assertEqual((channel.sent, channel.dropped), (50, 0))
+
+    def test_drops_oldest_when_full_and_reconnects(self):
+        address = free_address()
+        channel = KatajaChannel(address, max_queue=5, min_backoff=0.01, max_backoff=0.05)
+        for i in range(40):
+            channel.send({'i': i})
+        # nobody is listening, so at most max_queue messages are kept for each of the queue and the pending list
+        self.assertTrue(wait_until(lambda: channel.dropped >= 30))
+        listener = StubListener(address[1])
+        self.assertTrue(wait_until(lambda: channel.sent + channel.dropped == 40))
+        channel.send({'i': 40})
+        self.assertTrue(wait_until(lambda: channel.sent + channel.dropped == 41))
+        channel.close()
+        listener.thread.join(5.0)
+        self.assertFalse(channel.thread.is_alive())
+        sent = [message['i'] for message in listener.messages]
+        self.assertEqual(len(sent), channel.sent)
+        # what got through is the newest messages, in order
+        self.assertEqual(sent, list(range(41 - len(sent), 41)))
+
+
+if __name__ == '__main__':
+    unittest.main()
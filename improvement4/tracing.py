@@ -0,0 +1,67 @@
+""" Tracing for the parser. Events belong to named categories and are only recorded for categories that are switched
+on. Tracing in hot paths is guarded so that nothing is formatted or even collected when the category is off:
+
+    if tracing.ROUTES in tracing.active:
+        tracing.event(tracing.ROUTES, 'new route', route=new_combination, rs=new_combination.rs)
+
+Recorded events go to a ring buffer as (time, category, name, fields) and, if output is set, are written to it as
+text lines. Fields are turned into strings when the event is recorded, so the buffer shows the traced objects as
+they were then and doesn't keep them alive. """
+import time
+from collections import deque
+
+PARSE = 'parse'  # sentence level steps in grammar
+WORDS = 'words'  # word parts and signaler
+NODES = 'nodes'  # signals received by merge nodes
+EDGES = 'edges'  # merge and adjunct edges created
+ROUTES = 'routes'  # routes combined and walked
+ROUTE_SIGNALS = 'route_signals'  # scope computations of route signals
+ROUTE_LISTS = 'route_lists'  # all routes listed after each word and when picking the optimal route
+CATEGORIES = (PARSE, WORDS, NODES, EDGES, ROUTES, ROUTE_SIGNALS, ROUTE_LISTS)
+
+BUFFER_SIZE = 10000
+
+active = set()
+buffer = deque(maxlen=BUFFER_SIZE)
+output = None
+
+
+def enable(*categories, output_file=None):
+    """ Switch categories on, all of them if none are given. If output_file is given, events are also written
+    there. """
+    global output
+    for category in categories:
+        if category not in CATEGORIES:
+            raise ValueError(f'unknown trace category: {category}')
+    active.update(categories or CATEGORIES)
+    if output_file is not None:
+        output = output_file
+
+
+def disable(*categories):
+    """ Switch categories off, all of them if none are given """
+    if categories:
+        active.difference_update(categories)
+    else:
+        active.clear()
+
+
+def event(category, name, **fields):
+    fields = {key: str(value) for key, value in fields.items()}
+    buffer.append((time.perf_counter(), category, name, fields))
+    if output:
+        print(format_event(category, name, fields), file=output)
+
+
+def format_event(category, name, fields):
+    values = ', '.join(f'{key}: {value}' for key, value in fields.items())
+    return f'{category}: {name} {values}' if values else f'{category}: {name}'
+
+
+def events(*categories):
+    """ Recorded events in the buffer, only from given categories if they are given """
+    return [e for e in buffer if not categories or e[1] in categories]
+
+
+def clear():
+    buffer.clear()
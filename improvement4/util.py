@@ -6,36 +6,6 @@ def hue(signal):
     return h - math.floor(h)
 
 
-def find_edge(edges, start=None, end=None):
-    for edge in edges:
-        if edge.start == start and edge.end == end:
-            return edge
-
-
-def replace(item, old, new):
-    if isinstance(item, dict):
-        if old in item:
-            item[new] = item[old]
-            item[old] = 0
-        for key in list(item.keys()):
-            if isinstance(key, tuple):
-                x, y = key
-                if x == old and y == new or x == new and y == old:
-                    del item[key]
-                elif x == old:
-                    item[new, y] = item[old, y]
-                elif y == old:
-                    item[x, new] = item[x, old]
-        return item
-    elif isinstance(item, list):
-        return [replace(x, old, new) for x in item]
-    elif isinstance(item, tuple):
-        return tuple((replace(x, old, new) for x in item))
-    elif item == old:
-        return new
-    return old
-
-
 def build_tree(word_parts):
 
     def build_label(label, adjs):
@@ -1,9 +1,13 @@
+import tracing
+
+
 class WordPart:
     def __init__(self, li, signal):
         self.li = li
         self.signal = signal
         self.merged = False
-        print('created word part ', self)
+        if tracing.WORDS in tracing.active:
+            tracing.event(tracing.WORDS, 'created word part', wp=self)
 
     def __str__(self):
         return f'{self.li.id}-{self.signal}'